@@ -0,0 +1,36 @@
+import { onTaskDispatched } from 'firebase-functions/v2/tasks';
+import * as admin from 'firebase-admin';
+import { JOB_MAX_ATTEMPTS, runJob } from '../jobs/jobQueue';
+
+// Asegurar que Firebase Admin esté inicializado
+if (!admin.apps.length) {
+  admin.initializeApp();
+}
+
+/**
+ * Worker de la cola de Cloud Tasks que ejecuta los trabajos encolados con `enqueueJob`.
+ *
+ * Si el handler falla o la instancia se cae, Cloud Tasks reintenta la tarea y
+ * `runJob` continúa desde el último checkpoint guardado en `jobs/{jobId}`.
+ * El id de la tarea y su retryCount permiten que el reintento tome el lease del
+ * intento anterior (muerto por timeout o caída) sin esperar a que expire.
+ */
+export const jobWorker = onTaskDispatched(
+  {
+    region: 'us-central1',
+    retryConfig: {
+      maxAttempts: JOB_MAX_ATTEMPTS,
+      minBackoffSeconds: 30,
+    },
+    rateLimits: {
+      maxConcurrentDispatches: 5,
+    },
+    timeoutSeconds: 540,
+    memory: '1GiB',
+  },
+  async (req) => {
+    const { jobId } = req.data as { jobId?: string };
+    if (!jobId) return;
+    await runJob(jobId, { taskId: req.id, retryCount: req.retryCount });
+  }
+);
@@ -8,26 +8,33 @@ import { router as salesRouter } from './routes/sales';
 import { router as reportsRouter } from './routes/reports';
 import { bingoRouter } from './routes/bingo';
 import eventsRouter from './routes/events';
+import { router as jobsRouter } from './routes/jobs';
+import { instrumentFirestore, requestMetricsMiddleware, getMetricsSnapshot } from './metrics/instrumentation';
 
 // Inicializar Firebase Admin (solo si no está ya inicializado)
 if (!admin.apps.length) {
   admin.initializeApp();
 }
 
-// Exportar la base de datos Firestore
-export const db = admin.firestore();
+// Exportar la base de datos Firestore (instrumentada: cuenta lecturas/escrituras por request)
+export const db = instrumentFirestore(admin.firestore());
 export const bucket = admin.storage().bucket();
 
 // Crear la aplicación Express
 const app = express();
 
 // Middleware
+app.use(requestMetricsMiddleware); // Latencia y lecturas/escrituras de Firestore por ruta
 app.use(cors({ origin: true }));
 app.use(express.json());
 
 // Ruta de salud
 app.get('/health', (_req, res) => res.json({ ok: true }));
 
+// Métricas por ruta de esta instancia (latencia y documentos leídos/escritos)
+app.get('/api/metrics', (_req, res) => res.json(getMetricsSnapshot()));
+app.get('/metrics', (_req, res) => res.json(getMetricsSnapshot()));
+
 // Agregar prefijo /api a todas las rutas
 app.use('/api/vendors', vendorsRouter);
 app.use('/api/cards', cardsRouter);
@@ -35,6 +42,7 @@ app.use('/api/sales', salesRouter);
 app.use('/api/reports', reportsRouter);
 app.use('/api/bingo', bingoRouter);
 app.use('/api/events', eventsRouter);
+app.use('/api/jobs', jobsRouter);
 
 // Mantener rutas sin prefijo para compatibilidad
 app.use('/vendors', vendorsRouter);
@@ -43,6 +51,10 @@ app.use('/sales', salesRouter);
 app.use('/reports', reportsRouter);
 app.use('/bingo', bingoRouter);
 app.use('/events', eventsRouter);
+app.use('/jobs', jobsRouter);
 
 // Exportar la función HTTP de Firebase usando la sintaxis v2
 export const api = onRequest({ timeoutSeconds: 300, memory: "1GiB" }, app);
+
+// Worker de trabajos en segundo plano (Cloud Tasks)
+export { jobWorker } from './functions/jobWorker';
@@ -0,0 +1,355 @@
+import * as admin from 'firebase-admin';
+import { getFunctions } from 'firebase-admin/functions';
+import { db } from '../index';
+import { trackOperation } from '../metrics/instrumentation';
+
+/**
+ * Subsistema de trabajos en segundo plano para mutaciones masivas.
+ *
+ * Una ruta HTTP encola el trabajo (documento en `jobs/{jobId}`) y responde de
+ * inmediato con el jobId. El worker ejecuta el handler registrado para el tipo
+ * de trabajo y guarda un checkpoint en el documento después de cada página, de
+ * modo que si la instancia muere o se agota el tiempo, el reintento continúa
+ * desde el último checkpoint en lugar de empezar de cero.
+ *
+ * - Producción: los trabajos se despachan a la cola de Cloud Tasks `jobWorker`.
+ * - Emulador: una cola local en memoria sustituye a Cloud Tasks.
+ */
+
+export const JOBS_COLLECTION = 'jobs';
+export const JOB_WORKER_FUNCTION = 'jobWorker';
+
+// Documentos leídos por página; las escrituras de cada página van en paralelo con BulkWriter
+export const JOB_PAGE_SIZE = 500;
+
+// Intentos de Cloud Tasks por tarea (retryConfig del worker)
+export const JOB_MAX_ATTEMPTS = 5;
+
+// Tiempo que un worker "posee" un trabajo antes de que otro pueda retomarlo (> timeout del worker)
+const LEASE_MS = 10 * 60 * 1000;
+
+// `retrying`: el último intento falló y Cloud Tasks todavía lo reintentará.
+// `failed`: se agotaron los intentos (se puede re-despachar con POST /jobs/:id/resume).
+export type JobStatus = 'queued' | 'running' | 'retrying' | 'completed' | 'failed';
+
+// Entrega de Cloud Tasks que ejecuta el trabajo. Cloud Tasks no despacha un
+// reintento de una tarea hasta que el intento anterior terminó (error o timeout),
+// así que una entrega con retryCount mayor de la misma tarea puede tomar el lease.
+export interface JobDelivery {
+  taskId: string;
+  retryCount: number;
+}
+
+// Error reintentable: otro worker tiene el lease del trabajo
+export class JobLeaseHeldError extends Error {
+  constructor(jobId: string) {
+    super(`Job ${jobId} is leased by another worker; retry later`);
+    this.name = 'JobLeaseHeldError';
+  }
+}
+
+export interface JobProgress {
+  processed: number;
+  total: number | null;
+  state: Record<string, any>; // Cursores/fases propios de cada handler
+}
+
+export interface JobDoc {
+  id: string;
+  type: string;
+  params: Record<string, any>;
+  status: JobStatus;
+  progress: JobProgress;
+  attempts: number;
+  result: Record<string, any> | null;
+  error: string | null;
+  leaseExpiresAt: number | null;
+  leaseOwner: JobDelivery | null;
+  createdAt: number;
+  updatedAt: number;
+  startedAt: number | null;
+  completedAt: number | null;
+}
+
+export interface JobContext {
+  jobId: string;
+  params: Record<string, any>;
+  progress: JobProgress;
+  // Persiste el progreso (y renueva el lease). Llamar después de cada página confirmada.
+  checkpoint(update: Partial<JobProgress>): Promise<void>;
+}
+
+export type JobHandler = (ctx: JobContext) => Promise<Record<string, any>>;
+
+const handlers: Record<string, JobHandler> = {};
+
+export function registerJobHandler(type: string, handler: JobHandler) {
+  handlers[type] = handler;
+}
+
+function isLocalQueue(): boolean {
+  return process.env.FUNCTIONS_EMULATOR === 'true' || process.env.JOBS_LOCAL_QUEUE === 'true';
+}
+
+// Cola local para el emulador: ejecuta los trabajos de uno en uno dentro del proceso
+const localQueue: string[] = [];
+let localQueueDraining = false;
+
+function drainLocalQueue() {
+  if (localQueueDraining) return;
+  localQueueDraining = true;
+  setImmediate(async () => {
+    while (localQueue.length > 0) {
+      const jobId = localQueue.shift() as string;
+      try {
+        await runJob(jobId);
+      } catch (e: any) {
+        // Sin Cloud Tasks no hay reintento automático: el trabajo queda en `failed`
+        console.error(`Job ${jobId} failed:`, e.message);
+      }
+    }
+    localQueueDraining = false;
+  });
+}
+
+async function dispatchJob(jobId: string) {
+  if (isLocalQueue()) {
+    localQueue.push(jobId);
+    drainLocalQueue();
+    return;
+  }
+  await getFunctions().taskQueue(JOB_WORKER_FUNCTION).enqueue({ jobId });
+}
+
+/**
+ * Crea el documento del trabajo y lo despacha al worker. Devuelve el jobId.
+ */
+export async function enqueueJob(type: string, params: Record<string, any>): Promise<string> {
+  if (!handlers[type]) {
+    throw new Error(`Unknown job type: ${type}`);
+  }
+
+  const ref = db.collection(JOBS_COLLECTION).doc();
+  const now = Date.now();
+  await ref.set({
+    type,
+    params,
+    status: 'queued',
+    progress: { processed: 0, total: null, state: {} },
+    attempts: 0,
+    result: null,
+    error: null,
+    leaseExpiresAt: null,
+    leaseOwner: null,
+    createdAt: now,
+    updatedAt: now,
+    startedAt: null,
+    completedAt: null,
+  });
+
+  await dispatchJob(ref.id);
+  return ref.id;
+}
+
+/**
+ * Un trabajo se puede re-despachar si falló definitivamente o si su worker murió
+ * sin liberarlo (lease vencido). `queued` y `retrying` ya tienen una tarea pendiente
+ * y `running` con lease vigente tiene un worker vivo: otra tarea solo chocaría con el lease.
+ */
+export function isResumable(job: JobDoc, now: number = Date.now()): boolean {
+  if (job.status === 'failed') return true;
+  return job.status === 'running' && job.leaseExpiresAt != null && job.leaseExpiresAt <= now;
+}
+
+/**
+ * Vuelve a despachar un trabajo si `isResumable`; retoma desde el último checkpoint.
+ * Devuelve el trabajo y si se despachó.
+ */
+export async function resumeJob(jobId: string): Promise<{ job: JobDoc; dispatched: boolean } | null> {
+  const job = await getJob(jobId);
+  if (!job) return null;
+  if (!isResumable(job)) return { job, dispatched: false };
+  await dispatchJob(jobId);
+  return { job, dispatched: true };
+}
+
+export async function getJob(jobId: string): Promise<JobDoc | null> {
+  const snap = await db.collection(JOBS_COLLECTION).doc(jobId).get();
+  if (!snap.exists) return null;
+  return { id: snap.id, ...(snap.data() as any) } as JobDoc;
+}
+
+/**
+ * Ejecuta un trabajo. Primero lo reclama en una transacción (para que dos
+ * entregas del mismo mensaje no lo procesen a la vez) y luego llama a su handler.
+ * Si el handler lanza, el trabajo queda en `retrying` (o `failed` en el último
+ * intento) y el error se relanza para que Cloud Tasks lo reintente desde el checkpoint.
+ * Si otro worker vivo tiene el lease se lanza JobLeaseHeldError, también
+ * reintentable: nunca se confirma una entrega sin haber hecho el trabajo.
+ */
+export async function runJob(jobId: string, delivery: JobDelivery | null = null): Promise<void> {
+  let label = 'JOB (skipped)';
+  return trackOperation(() => label, async () => {
+    const ref = db.collection(JOBS_COLLECTION).doc(jobId);
+    const claimed = await claimJob(jobId, ref, delivery);
+    if (!claimed) return;
+    label = `JOB ${claimed.type}`;
+    await executeJob(jobId, ref, claimed, delivery);
+  });
+}
+
+// El intento anterior de la misma tarea ya terminó (Cloud Tasks solo reintenta después)
+function isRetryOfLeaseOwner(job: JobDoc, delivery: JobDelivery | null): boolean {
+  return delivery != null &&
+    job.leaseOwner != null &&
+    job.leaseOwner.taskId === delivery.taskId &&
+    delivery.retryCount > job.leaseOwner.retryCount;
+}
+
+async function claimJob(
+  jobId: string,
+  ref: FirebaseFirestore.DocumentReference,
+  delivery: JobDelivery | null,
+): Promise<JobDoc | null> {
+  return db.runTransaction(async (t) => {
+    const snap = await t.get(ref);
+    if (!snap.exists) return null;
+    const job = snap.data() as JobDoc;
+    const now = Date.now();
+
+    if (job.status === 'completed') return null;
+    if (job.status === 'running' && (job.leaseExpiresAt ?? 0) > now && !isRetryOfLeaseOwner(job, delivery)) {
+      throw new JobLeaseHeldError(jobId);
+    }
+
+    t.update(ref, {
+      status: 'running',
+      attempts: admin.firestore.FieldValue.increment(1),
+      leaseExpiresAt: now + LEASE_MS,
+      leaseOwner: delivery,
+      startedAt: job.startedAt ?? now,
+      updatedAt: now,
+      error: null,
+    });
+    return job;
+  });
+}
+
+async function executeJob(
+  jobId: string,
+  ref: FirebaseFirestore.DocumentReference,
+  claimed: JobDoc,
+  delivery: JobDelivery | null,
+): Promise<void> {
+  const handler = handlers[claimed.type];
+  if (!handler) {
+    await ref.update({
+      status: 'failed',
+      error: `Unknown job type: ${claimed.type}`,
+      leaseExpiresAt: null,
+      leaseOwner: null,
+      updatedAt: Date.now(),
+    });
+    return;
+  }
+
+  const progress: JobProgress = {
+    processed: claimed.progress?.processed ?? 0,
+    total: claimed.progress?.total ?? null,
+    state: claimed.progress?.state ?? {},
+  };
+
+  const ctx: JobContext = {
+    jobId,
+    params: claimed.params ?? {},
+    progress,
+    checkpoint: async (update) => {
+      Object.assign(progress, update);
+      const now = Date.now();
+      await ref.update({ progress, leaseExpiresAt: now + LEASE_MS, updatedAt: now });
+    },
+  };
+
+  try {
+    const result = await handler(ctx);
+    const now = Date.now();
+    await ref.update({
+      status: 'completed',
+      progress,
+      result,
+      leaseExpiresAt: null,
+      leaseOwner: null,
+      updatedAt: now,
+      completedAt: now,
+    });
+  } catch (e: any) {
+    // Con entrega de Cloud Tasks y reintentos pendientes el fallo no es definitivo
+    const willRetry = delivery != null && delivery.retryCount + 1 < JOB_MAX_ATTEMPTS;
+    await ref.update({
+      status: willRetry ? 'retrying' : 'failed',
+      error: e.message ?? String(e),
+      leaseExpiresAt: null,
+      leaseOwner: null,
+      updatedAt: Date.now(),
+    });
+    throw e;
+  }
+}
+
+/**
+ * Elimina todos los documentos de `query` página por página con BulkWriter,
+ * guardando el cursor en `ctx.progress.state[key]` tras cada página. Al retomar
+ * continúa desde el cursor; si la fase ya terminó, devuelve su conteo sin leer nada.
+ */
+export async function deleteQueryWithCheckpoints(
+  ctx: JobContext,
+  key: string,
+  query: FirebaseFirestore.Query,
+): Promise<number> {
+  const phase = ctx.progress.state[key] ?? { cursor: null, deleted: 0, done: false };
+  if (phase.done) return phase.deleted as number;
+
+  let cursor: string | null = phase.cursor;
+  let deleted: number = phase.deleted;
+  const writer = db.bulkWriter();
+
+  try {
+    while (true) {
+      let page = query
+        .orderBy(admin.firestore.FieldPath.documentId())
+        .select()
+        .limit(JOB_PAGE_SIZE);
+      if (cursor) page = page.startAfter(cursor);
+
+      const snapshot = await page.get();
+      if (snapshot.empty) break;
+
+      let failed = 0;
+      snapshot.docs.forEach((doc) => {
+        writer.delete(doc.ref).catch(() => {
+          failed++;
+        });
+      });
+      await writer.flush();
+      if (failed > 0) {
+        throw new Error(`${failed} deletes failed in ${key}; will resume from last checkpoint`);
+      }
+
+      cursor = snapshot.docs[snapshot.docs.length - 1].id;
+      deleted += snapshot.size;
+      await ctx.checkpoint({
+        processed: ctx.progress.processed + snapshot.size,
+        state: { ...ctx.progress.state, [key]: { cursor, deleted, done: false } },
+      });
+
+      if (snapshot.size < JOB_PAGE_SIZE) break;
+    }
+  } finally {
+    await writer.close();
+  }
+
+  await ctx.checkpoint({
+    state: { ...ctx.progress.state, [key]: { cursor, deleted, done: true } },
+  });
+  return deleted;
+}
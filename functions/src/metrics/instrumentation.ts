@@ -0,0 +1,318 @@
+import { AsyncLocalStorage } from 'async_hooks';
+import { logger } from 'firebase-functions';
+import {
+  Firestore,
+  Query,
+  DocumentReference,
+  AggregateQuery,
+  AggregateQuerySnapshot,
+  QuerySnapshot,
+  Transaction,
+  WriteBatch,
+  BulkWriter,
+} from 'firebase-admin/firestore';
+
+/**
+ * Instrumentación de latencia y lecturas/escrituras de Firestore por ruta.
+ *
+ * `instrumentFirestore(db)` envuelve los métodos de lectura y escritura del SDK;
+ * el middleware abre un ámbito por request (AsyncLocalStorage) donde se acumulan
+ * los documentos leídos/escritos. Al terminar la respuesta se emite una línea de
+ * log estructurada (`request_metrics`) y se actualizan los histogramas en memoria
+ * que expone GET /api/metrics. Los histogramas son por instancia y se pierden al
+ * reciclarla; para análisis histórico usar los logs con `metrics_report.py`.
+ */
+
+export interface OperationMetrics {
+  reads: number; // Total facturable (incluye agregaciones y transacciones)
+  aggregationReads: number;
+  transactionReads: number;
+  writes: number; // create/set/update
+  deletes: number;
+}
+
+interface MetricsScope {
+  metrics: OperationMetrics;
+  nested: boolean; // Dentro de otra llamada instrumentada (evita contar dos veces)
+}
+
+const storage = new AsyncLocalStorage<MetricsScope>();
+
+function newOperationMetrics(): OperationMetrics {
+  return { reads: 0, aggregationReads: 0, transactionReads: 0, writes: 0, deletes: 0 };
+}
+
+// Lecturas facturadas por el resultado de una lectura
+function countReads(result: any): { reads: number; aggregation: boolean } {
+  if (Array.isArray(result)) {
+    return { reads: result.length, aggregation: false };
+  }
+  if (result instanceof QuerySnapshot) {
+    // Una consulta vacía se factura como 1 lectura
+    return { reads: Math.max(1, result.size), aggregation: false };
+  }
+  if (result instanceof AggregateQuerySnapshot) {
+    // count() se factura 1 lectura por cada 1000 entradas de índice (mínimo 1)
+    const count = (result.data() as any).count;
+    return { reads: typeof count === 'number' ? Math.max(1, Math.ceil(count / 1000)) : 1, aggregation: true };
+  }
+  return { reads: 1, aggregation: false };
+}
+
+function instrument(proto: any, method: string, wrap: (original: any) => (this: any, ...args: any[]) => any) {
+  const original = proto[method];
+  if (!original || original.__instrumented) return;
+  const wrapped = wrap(original);
+  (wrapped as any).__instrumented = true;
+  proto[method] = wrapped;
+}
+
+function wrapRead(proto: any, method: string, inTransaction: boolean) {
+  instrument(proto, method, (original) => function (this: any, ...args: any[]) {
+    const scope = storage.getStore();
+    if (!scope || scope.nested) return original.apply(this, args);
+
+    return storage
+      .run({ metrics: scope.metrics, nested: true }, () => original.apply(this, args))
+      .then((result: any) => {
+        const { reads, aggregation } = countReads(result);
+        scope.metrics.reads += reads;
+        if (aggregation) scope.metrics.aggregationReads += reads;
+        if (inTransaction) scope.metrics.transactionReads += reads;
+        return result;
+      });
+  });
+}
+
+type WriteKind = 'writes' | 'deletes';
+
+// Operaciones encoladas en cada WriteBatch, pendientes de confirmar
+const pendingWrites = new WeakMap<object, WriteKind[]>();
+
+// WriteBatch.create/set/update/delete: solo registra la operación; se cuenta al confirmar
+function wrapBatchWrite(method: string, kind: WriteKind) {
+  instrument(WriteBatch.prototype, method, (original) => function (this: any, ...args: any[]) {
+    const result = original.apply(this, args);
+    const pending = pendingWrites.get(this) ?? [];
+    pending.push(kind);
+    pendingWrites.set(this, pending);
+    return result;
+  });
+}
+
+// Cuenta las operaciones del batch solo si el commit tiene éxito. `_commit` es el
+// punto común de batch.commit(), DocumentReference.set/update/delete y las transacciones.
+function wrapBatchCommit() {
+  const method = typeof (WriteBatch.prototype as any)._commit === 'function' ? '_commit' : 'commit';
+  instrument(WriteBatch.prototype, method, (original) => function (this: any, ...args: any[]) {
+    const scope = storage.getStore();
+    const result = original.apply(this, args);
+    if (!scope) return result;
+    return result.then((value: any) => {
+      (pendingWrites.get(this) ?? []).forEach(kind => scope.metrics[kind]++);
+      pendingWrites.delete(this);
+      return value;
+    });
+  });
+
+  // runTransaction vacía el batch antes de reintentar el callback: descartar lo encolado
+  instrument(WriteBatch.prototype, '_reset', (original) => function (this: any, ...args: any[]) {
+    pendingWrites.delete(this);
+    return original.apply(this, args);
+  });
+}
+
+// BulkWriter confirma sus lotes sin pasar por `_commit` y reintenta operaciones
+// fallidas: cada promesa se resuelve una sola vez, cuando la escritura se aplicó
+function wrapBulkWrite(method: string, kind: WriteKind) {
+  instrument(BulkWriter.prototype, method, (original) => function (this: any, ...args: any[]) {
+    const scope = storage.getStore();
+    const result = original.apply(this, args);
+    if (!scope) return result;
+    return result.then((value: any) => {
+      scope.metrics[kind]++;
+      return value;
+    });
+  });
+}
+
+/**
+ * Envuelve el cliente de Firestore para contar lecturas y escrituras en el ámbito
+ * actual. Las escrituras se cuentan al confirmarse (no al encolarse), así que los
+ * reintentos de transacciones y de BulkWriter no las cuentan dos veces.
+ */
+export function instrumentFirestore(db: Firestore): Firestore {
+  wrapRead(DocumentReference.prototype, 'get', false);
+  wrapRead(Query.prototype, 'get', false);
+  wrapRead(AggregateQuery.prototype, 'get', false);
+  wrapRead(Firestore.prototype, 'getAll', false);
+  wrapRead(Transaction.prototype, 'get', true);
+  wrapRead(Transaction.prototype, 'getAll', true);
+
+  wrapBatchWrite('create', 'writes');
+  wrapBatchWrite('set', 'writes');
+  wrapBatchWrite('update', 'writes');
+  wrapBatchWrite('delete', 'deletes');
+  wrapBatchCommit();
+
+  wrapBulkWrite('create', 'writes');
+  wrapBulkWrite('set', 'writes');
+  wrapBulkWrite('update', 'writes');
+  wrapBulkWrite('delete', 'deletes');
+
+  return db;
+}
+
+// ===== Histogramas en memoria =====
+
+const LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000];
+const DOC_BUCKETS = [0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000];
+
+interface Histogram {
+  bounds: number[];
+  counts: number[]; // counts[i] = valores <= bounds[i]; el último es +Inf
+  sum: number;
+  max: number;
+}
+
+function newHistogram(bounds: number[]): Histogram {
+  return { bounds, counts: new Array(bounds.length + 1).fill(0), sum: 0, max: 0 };
+}
+
+function observe(h: Histogram, value: number) {
+  let i = 0;
+  while (i < h.bounds.length && value > h.bounds[i]) i++;
+  h.counts[i]++;
+  h.sum += value;
+  if (value > h.max) h.max = value;
+}
+
+// Percentil aproximado: límite superior del bucket que lo contiene
+function percentile(h: Histogram, p: number): number {
+  const total = h.counts.reduce((a, b) => a + b, 0);
+  if (total === 0) return 0;
+  const rank = Math.ceil(total * p);
+  let seen = 0;
+  for (let i = 0; i < h.counts.length; i++) {
+    seen += h.counts[i];
+    if (seen >= rank) return i < h.bounds.length ? Math.min(h.bounds[i], h.max) : h.max;
+  }
+  return h.max;
+}
+
+interface RouteStats {
+  count: number;
+  statuses: Record<string, number>;
+  latencyMs: Histogram;
+  reads: Histogram;
+  writes: Histogram;
+  aggregationReads: number;
+  transactionReads: number;
+  deletes: number;
+}
+
+const routeStats: Record<string, RouteStats> = {};
+const startedAt = Date.now();
+
+function recordOperation(route: string, status: number, latencyMs: number, metrics: OperationMetrics) {
+  const stats = routeStats[route] ??= {
+    count: 0,
+    statuses: {},
+    latencyMs: newHistogram(LATENCY_BUCKETS_MS),
+    reads: newHistogram(DOC_BUCKETS),
+    writes: newHistogram(DOC_BUCKETS),
+    aggregationReads: 0,
+    transactionReads: 0,
+    deletes: 0,
+  };
+
+  stats.count++;
+  const statusClass = `${Math.floor(status / 100)}xx`;
+  stats.statuses[statusClass] = (stats.statuses[statusClass] ?? 0) + 1;
+  observe(stats.latencyMs, latencyMs);
+  observe(stats.reads, metrics.reads);
+  observe(stats.writes, metrics.writes + metrics.deletes);
+  stats.aggregationReads += metrics.aggregationReads;
+  stats.transactionReads += metrics.transactionReads;
+  stats.deletes += metrics.deletes;
+
+  logger.info('request_metrics', {
+    route,
+    status,
+    latencyMs: Math.round(latencyMs * 10) / 10,
+    ...metrics,
+  });
+}
+
+function summarize(h: Histogram) {
+  const total = h.counts.reduce((a, b) => a + b, 0);
+  return {
+    total: h.sum,
+    mean: total > 0 ? Math.round((h.sum / total) * 10) / 10 : 0,
+    p50: percentile(h, 0.5),
+    p95: percentile(h, 0.95),
+    p99: percentile(h, 0.99),
+    max: h.max,
+  };
+}
+
+/**
+ * Resumen de los histogramas de esta instancia (percentiles aproximados por bucket)
+ */
+export function getMetricsSnapshot() {
+  const routes: Record<string, any> = {};
+  for (const [route, stats] of Object.entries(routeStats)) {
+    routes[route] = {
+      count: stats.count,
+      statuses: stats.statuses,
+      latencyMs: summarize(stats.latencyMs),
+      reads: { ...summarize(stats.reads), aggregation: stats.aggregationReads, transaction: stats.transactionReads },
+      writes: { ...summarize(stats.writes), deletes: stats.deletes },
+    };
+  }
+  return { instanceStartedAt: startedAt, uptimeMs: Date.now() - startedAt, routes };
+}
+
+// ===== Ámbitos por request / trabajo =====
+
+// Etiqueta estable de la ruta: patrón de Express sin el prefijo /api (p. ej. "POST /cards/:id/assign")
+function routeLabel(req: any): string {
+  if (!req.route) return `${req.method} (unmatched)`;
+  const path = `${req.baseUrl ?? ''}${req.route.path}`.replace(/^\/api(?=\/|$)/, '');
+  return `${req.method} ${path || '/'}`;
+}
+
+/**
+ * Middleware de Express: mide latencia y operaciones de Firestore de cada request
+ */
+export function requestMetricsMiddleware(req: any, res: any, next: any) {
+  const start = process.hrtime.bigint();
+  const metrics = newOperationMetrics();
+
+  res.on('finish', () => {
+    const latencyMs = Number(process.hrtime.bigint() - start) / 1e6;
+    recordOperation(routeLabel(req), res.statusCode, latencyMs, metrics);
+  });
+
+  storage.run({ metrics, nested: false }, () => next());
+}
+
+/**
+ * Mide una operación fuera de Express (trabajos en segundo plano, triggers).
+ * `label` se evalúa al terminar, para poder usar datos conocidos durante la ejecución.
+ */
+export async function trackOperation<T>(label: () => string, fn: () => Promise<T>): Promise<T> {
+  const start = process.hrtime.bigint();
+  const metrics = newOperationMetrics();
+  let status = 200;
+
+  try {
+    return await storage.run({ metrics, nested: false }, fn);
+  } catch (e) {
+    status = 500;
+    throw e;
+  } finally {
+    const latencyMs = Number(process.hrtime.bigint() - start) / 1e6;
+    recordOperation(label(), status, latencyMs, metrics);
+  }
+}
@@ -1,6 +1,9 @@
 import { Router } from 'express';
 import { z } from 'zod';
+import * as admin from 'firebase-admin';
 import { db } from '../index';
+import type { CardStatus } from '../types/firestore';
+import { registerJobHandler, enqueueJob, deleteQueryWithCheckpoints, JOB_PAGE_SIZE } from '../jobs/jobQueue';
 
 interface CardDoc {
   id: string;
@@ -11,10 +14,24 @@ interface CardDoc {
   date?: string; // Fecha del evento (ISO 8601)
   assignedTo?: string; // vendorId
   sold: boolean;
+  status?: CardStatus; // Denormalizado de (assignedTo, sold) para filtrar y paginar
   createdAt: number;
+  updatedAt?: number; // Última escritura (watermark para sincronización incremental)
   cardNo?: number; // Número secuencial de cartilla
 }
 
+/**
+ * Estado denormalizado de la cartilla: 'free' | 'assigned:<vendorId>' | 'sold:<vendorId>'.
+ * Combina assignedTo y sold en un solo campo para que cualquier combinación de filtros
+ * sea una igualdad y pueda paginar con el índice (status, cardNo).
+ * Toda escritura que cambie assignedTo o sold debe actualizarlo.
+ */
+export function cardStatus(assignedTo: string | null | undefined, sold: boolean): CardStatus {
+  if (sold) return `sold:${assignedTo ?? ''}`;
+  if (assignedTo) return `assigned:${assignedTo}`;
+  return 'free';
+}
+
 const createCardSchema = z.object({
   numbers: z.array(z.array(z.number())),
   eventId: z.string().min(1, 'eventId es requerido'),
@@ -86,8 +103,10 @@ router.post('/', async (req: any, res: any) => {
       eventId: parsed.eventId,
       assignedTo: null,
       sold: false,
+      status: cardStatus(null, false),
       createdAt: Date.now(),
     } as any;
+    dataToSave.updatedAt = dataToSave.createdAt;
     let docId: string;
     if (parsed.cardNo) {
       docId = String(parsed.cardNo);
@@ -147,59 +166,47 @@ router.get('/', async (_req: any, res: any) => {
   }
 
   // Nueva ruta: events/{date}/cards
-  let q = db.collection('events').doc(date).collection('cards') as any;
+  const cardsCollectionRef = db.collection('events').doc(date).collection('cards');
+  let q: FirebaseFirestore.Query = cardsCollectionRef;
 
-  const hasAssignedToFilter = !!assignedTo;
+  // Cada combinación de filtros es una igualdad (o `in`) + orderBy cardNo,
+  // respaldada por los índices de firestore.indexes.json.
+  // Mientras el evento no tenga `status` rellenado (POST /cards/backfill-status)
+  // se filtra por `assignedTo`, que existe en todas las cartillas.
   const hasSoldFilter = sold === 'true' || sold === 'false';
-  const hasMultipleFilters = hasAssignedToFilter && hasSoldFilter;
-
-  if (assignedTo) q = q.where('assignedTo', '==', assignedTo);
-  if (sold === 'true') q = q.where('sold', '==', true);
-  if (sold === 'false') q = q.where('sold', '==', false);
-
-  // Si hay múltiples filtros, no usar orderBy en Firestore (requiere índice compuesto)
-  // En su lugar, ordenaremos en memoria después
-  let useOrderBy = !hasMultipleFilters;
-
-  if (useOrderBy) {
-    q = q.orderBy('cardNo', 'asc');
+  if (assignedTo && !(await isStatusBackfilled(date))) {
+    q = q.where('assignedTo', '==', assignedTo);
+    if (hasSoldFilter) q = q.where('sold', '==', sold === 'true');
+  } else if (assignedTo && hasSoldFilter) {
+    q = q.where('status', '==', cardStatus(assignedTo, sold === 'true'));
+  } else if (assignedTo) {
+    q = q.where('status', 'in', [cardStatus(assignedTo, false), cardStatus(assignedTo, true)]);
+  } else if (hasSoldFilter) {
+    q = q.where('sold', '==', sold === 'true');
   }
 
-  // Implementar paginación con cursor - OPTIMIZADO: límite por defecto de 50 para reducir lecturas
-  const pageSize = limit ? Math.min(parseInt(limit), 2000) : 50; // Reducido de 2000 a 50 por defecto
-  q = q.limit(pageSize);
-
-  // Si hay cursor (startAfter) y no hay múltiples filtros, continuar desde ahí
-  if (startAfter && useOrderBy) {
-    try {
-      const startAfterDoc = await db.collection('events').doc(date).collection('cards').doc(startAfter).get();
-      if (startAfterDoc.exists) {
-        q = q.startAfter(startAfterDoc);
+  // Paginación keyset por cardNo - OPTIMIZADO: límite por defecto de 50 para reducir lecturas
+  const pageSize = limit ? Math.min(parseInt(limit), 2000) : 50;
+  q = q.orderBy('cardNo', 'asc').limit(pageSize);
+
+  // El cursor es el cardNo de la última cartilla de la página anterior (sin lectura extra).
+  // Por compatibilidad se acepta también un id de documento (1 lectura para obtener su cardNo).
+  if (startAfter) {
+    let cursorCardNo: number | null = /^\d+$/.test(startAfter) ? parseInt(startAfter, 10) : null;
+    if (cursorCardNo == null) {
+      const startAfterDoc = await cardsCollectionRef.doc(startAfter).get();
+      if (startAfterDoc.exists && typeof startAfterDoc.data()?.cardNo === 'number') {
+        cursorCardNo = startAfterDoc.data()?.cardNo as number;
       }
-    } catch (e) {
-      // Si el documento no existe, ignorar el cursor
     }
-  }
-
-  let snaps;
-  try {
-    snaps = await q.get();
-  } catch (e: any) {
-    // Si falla por falta de índice, intentar sin orderBy y ordenar en memoria
-    if (e.message && e.message.includes('index')) {
-      useOrderBy = false;
-      q = db.collection('events').doc(date).collection('cards') as any;
-      if (assignedTo) q = q.where('assignedTo', '==', assignedTo);
-      if (sold === 'true') q = q.where('sold', '==', true);
-      if (sold === 'false') q = q.where('sold', '==', false);
-      q = q.limit(pageSize);
-      snaps = await q.get();
-    } else {
-      throw e;
+    if (cursorCardNo != null) {
+      q = q.startAfter(cursorCardNo);
     }
   }
 
-  let out = snaps.docs.map((d: any) => {
+  const snaps = await q.get();
+
+  const out = snaps.docs.map((d: any) => {
     const data = d.data();
     const size = (data.gridSize as number) ?? 5;
     const numbers = data.numbers ? (data.numbers as number[][]) : expandGrid((data.numbersFlat as number[]) ?? [], size);
@@ -209,38 +216,116 @@ router.get('/', async (_req: any, res: any) => {
       assignedTo: data.assignedTo ?? null,
       sold: data.sold ?? false,
       createdAt: data.createdAt,
+      updatedAt: data.updatedAt ?? data.createdAt,
       cardNo: data.cardNo ?? null,
       date: date, // Incluir la fecha del evento
     } as CardDoc;
   });
 
-  // Si hay múltiples filtros o no se pudo usar orderBy, ordenar en memoria
-  if (hasMultipleFilters || !useOrderBy) {
-    out.sort((a: CardDoc, b: CardDoc) => {
-      if (a.cardNo != null && b.cardNo != null) {
-        return a.cardNo - b.cardNo;
-      }
-      if (a.cardNo != null && b.cardNo == null) return -1;
-      if (a.cardNo == null && b.cardNo != null) return 1;
-      return 0;
-    });
-  }
-
   // Determinar si hay más páginas
   const hasMore = snaps.docs.length === pageSize;
-  const lastDocId = snaps.docs.length > 0 ? snaps.docs[snaps.docs.length - 1].id : null;
+  const last = out.length > 0 ? out[out.length - 1] : null;
 
   return res.json({
     cards: out,
     pagination: {
       hasMore,
-      lastDocId,
+      lastDocId: last ? last.id : null,
+      lastCardNo: last ? last.cardNo : null, // Cursor para el siguiente `startAfter`
       pageSize: out.length,
       totalInPage: out.length
     }
   });
 });
 
+// Sincronización incremental: cartillas escritas después de `since` (ms epoch)
+// Pagina por (updatedAt, id) con cursor "updatedAt:id". La primera página incluye `total`
+// (count() = 1 lectura) para que el cliente detecte eliminaciones y haga una resincronización completa.
+//
+// IMPORTANTE: `updatedAt` se toma con el reloj del servidor antes de confirmar la escritura,
+// así que una escritura confirmada después de una sincronización puede llevar un updatedAt
+// menor que el watermark devuelto. El cliente DEBE pedir `since = watermark - margen`
+// (CartillasCacheService._syncOverlapMs, 60s) o perderá esas cartillas para siempre.
+router.get('/changes', async (_req: any, res: any) => {
+  try {
+    const { date, since, limit, cursor } = _req.query as {
+      date?: string;
+      since?: string;
+      limit?: string;
+      cursor?: string;
+    };
+
+    if (!date) {
+      return res.status(400).json({
+        error: 'El parámetro "date" es requerido (formato: YYYY-MM-DD)'
+      });
+    }
+
+    const sinceMs = since ? parseInt(since, 10) : 0;
+    if (isNaN(sinceMs)) {
+      return res.status(400).json({ error: 'El parámetro "since" debe ser un timestamp en ms' });
+    }
+
+    const pageSize = limit ? Math.min(parseInt(limit), 2000) : 500;
+    const cardsCollectionRef = db.collection('events').doc(date).collection('cards');
+
+    let q = cardsCollectionRef
+      .where('updatedAt', '>', sinceMs)
+      .orderBy('updatedAt', 'asc')
+      .orderBy(admin.firestore.FieldPath.documentId(), 'asc')
+      .limit(pageSize);
+
+    if (cursor) {
+      const sep = cursor.indexOf(':');
+      const cursorUpdatedAt = parseInt(cursor.slice(0, sep), 10);
+      const cursorId = cursor.slice(sep + 1);
+      if (sep > 0 && !isNaN(cursorUpdatedAt) && cursorId) {
+        q = q.startAfter(cursorUpdatedAt, cursorId);
+      }
+    }
+
+    // El total solo se calcula en la primera página; las siguientes lo omiten
+    const [snaps, countAggregation] = await Promise.all([
+      q.get(),
+      cursor ? Promise.resolve(null) : cardsCollectionRef.count().get(),
+    ]);
+
+    let watermark = sinceMs;
+    const cards: CardDoc[] = snaps.docs.map((d: any) => {
+      const data = d.data();
+      const size = (data.gridSize as number) ?? 5;
+      const numbers = data.numbers ? (data.numbers as number[][]) : expandGrid((data.numbersFlat as number[]) ?? [], size);
+      watermark = Math.max(watermark, data.updatedAt as number);
+      return {
+        id: d.id,
+        numbers,
+        assignedTo: data.assignedTo ?? null,
+        sold: data.sold ?? false,
+        createdAt: data.createdAt,
+        updatedAt: data.updatedAt,
+        cardNo: data.cardNo ?? null,
+        date: date,
+      } as CardDoc;
+    });
+
+    const hasMore = snaps.docs.length === pageSize;
+    const last = cards.length > 0 ? cards[cards.length - 1] : null;
+
+    return res.json({
+      cards,
+      watermark,
+      total: countAggregation ? countAggregation.data().count : null,
+      pagination: {
+        hasMore,
+        cursor: hasMore && last ? `${last.updatedAt}:${last.id}` : null,
+        pageSize: cards.length,
+      },
+    });
+  } catch (e: any) {
+    return res.status(500).json({ error: e.message });
+  }
+});
+
 // Endpoint de búsqueda directa por número de cartilla (cardNo)
 router.get('/search', async (_req: any, res: any) => {
   try {
@@ -356,7 +441,11 @@ router.post('/:id/assign', async (req: any, res: any) => {
       return res.status(400).json({ error: 'Invalid vendor role' });
     }
 
-    await cardRef.update({ assignedTo: parsed.vendorId });
+    await cardRef.update({
+      assignedTo: parsed.vendorId,
+      status: cardStatus(parsed.vendorId, cardData.sold === true),
+      updatedAt: Date.now(),
+    });
     const data = (await cardRef.get()).data() as any;
     const size = (data.gridSize as number) ?? 5;
     const numbers = data.numbers ? (data.numbers as number[][]) : expandGrid((data.numbersFlat as number[]) ?? [], size);
@@ -501,9 +590,12 @@ router.post('/bulk-assign', async (req: any, res: any) => {
     let assignedCount = 0;
 
     for (const chunk of chunks) {
+      // Un updatedAt por lote, tomado justo antes de confirmarlo, para que los lotes
+      // posteriores no queden por debajo de un watermark ya entregado por /changes
       const batch = db.batch();
+      const updatedAt = Date.now();
       for (const doc of chunk) {
-        batch.update(doc.ref, { assignedTo: vendorId });
+        batch.update(doc.ref, { assignedTo: vendorId, status: cardStatus(vendorId, false), updatedAt });
       }
       await batch.commit();
       assignedCount += chunk.length;
@@ -558,13 +650,17 @@ router.post('/generate', async (req: any, res: any) => {
 
     // Obtener el siguiente número de cartilla en esta fecha
     let nextCardNo = 1;
+    let isNewEvent = false;
     try {
       const lastCardQuery = await cardsCollectionRef
         .orderBy('cardNo', 'desc')
         .limit(1)
         .get();
 
-      if (!lastCardQuery.empty) {
+      if (lastCardQuery.empty) {
+        // Sin cartillas con cardNo; confirmar que tampoco hay cartillas legacy sin él (1 lectura)
+        isNewEvent = (await cardsCollectionRef.select().limit(1).get()).empty;
+      } else {
         const lastCard = lastCardQuery.docs[0].data();
         if (lastCard.cardNo && typeof lastCard.cardNo === 'number') {
           nextCardNo = lastCard.cardNo + 1;
@@ -597,6 +693,7 @@ router.post('/generate', async (req: any, res: any) => {
         }
       }
 
+      isNewEvent = allCards.length === 0;
       if (allCards.length > 0) {
         const cardNumbers = allCards
           .map(d => d.cardNo)
@@ -607,6 +704,11 @@ router.post('/generate', async (req: any, res: any) => {
       }
     }
 
+    // Un evento nuevo solo tendrá cartillas con `status`: no necesita backfill
+    if (isNewEvent) {
+      await markStatusBackfilled(date, 'generate');
+    }
+
     // Firebase limita a 500 operaciones por batch
     const BATCH_SIZE = 500;
     const generatedCards: any[] = [];
@@ -632,7 +734,9 @@ router.post('/generate', async (req: any, res: any) => {
           gridSize: 5,
           assignedTo: null,
           sold: false,
+          status: cardStatus(null, false),
           createdAt: Date.now(),
+          updatedAt: Date.now(),
           cardNo: cardNo,
         };
 
@@ -666,7 +770,27 @@ router.post('/generate', async (req: any, res: any) => {
   }
 });
 
+// Trabajo en segundo plano: eliminar todas las cartillas de un evento
+registerJobHandler('cards.clear', async (ctx) => {
+  const date = ctx.params.date as string;
+  const cardsCollectionRef = db.collection('events').doc(date).collection('cards');
+
+  if (ctx.progress.total == null) {
+    const countAggregation = await cardsCollectionRef.count().get();
+    await ctx.checkpoint({ total: countAggregation.data().count });
+  }
+
+  const deletedCount = await deleteQueryWithCheckpoints(ctx, 'cards', cardsCollectionRef);
+
+  return {
+    message: `Se eliminaron ${deletedCount} cartillas correctamente del evento ${date}`,
+    deletedCount,
+    eventDate: date,
+  };
+});
+
 // Endpoint para eliminar TODAS las cartillas (DEBE ir ANTES de /:id)
+// Encola un trabajo y responde 202 con el jobId; el progreso se consulta en GET /api/jobs/:id
 router.delete('/clear', async (req: any, res: any) => {
   try {
     const { date } = req.query as { date?: string };
@@ -678,49 +802,13 @@ router.delete('/clear', async (req: any, res: any) => {
       });
     }
 
-    const cardsCollectionRef = db.collection('events').doc(date).collection('cards');
-    const BATCH_SIZE = 500; // Límite de Firestore
-    let deletedCount = 0;
-    let lastDoc: any = null;
-    let hasMore = true;
-
-    // Procesar en chunks para evitar exceder el límite de 500 operaciones por batch
-    while (hasMore) {
-      let query = cardsCollectionRef.orderBy('__name__', 'asc').limit(BATCH_SIZE) as any;
-
-      // Si hay un documento anterior, continuar desde ahí
-      if (lastDoc) {
-        query = query.startAfter(lastDoc);
-      }
-
-      const batch = db.batch();
-      const snapshot = await query.get();
-
-      if (snapshot.empty) {
-        hasMore = false;
-        break;
-      }
-
-      // Agregar todas las cartillas del chunk al batch
-      snapshot.docs.forEach((doc: any) => {
-        batch.delete(doc.ref);
-        lastDoc = doc;
-      });
-
-      // Ejecutar el batch
-      await batch.commit();
-      deletedCount += snapshot.docs.length;
-
-      // Si obtuvimos menos de BATCH_SIZE, no hay más documentos
-      if (snapshot.docs.length < BATCH_SIZE) {
-        hasMore = false;
-      }
-    }
+    const jobId = await enqueueJob('cards.clear', { date });
 
-    return res.status(200).json({
-      message: `Se eliminaron ${deletedCount} cartillas correctamente del evento ${date}`,
-      deletedCount,
-      eventDate: date
+    return res.status(202).json({
+      message: `Eliminación de cartillas del evento ${date} encolada`,
+      jobId,
+      status: 'queued',
+      eventDate: date,
     });
   } catch (e: any) {
     return res.status(500).json({ error: 'Internal server error', details: e.message });
@@ -769,7 +857,11 @@ router.post('/:id/unassign', async (req: any, res: any) => {
       return res.status(404).json({ error: 'Card not found' });
     }
 
-    await cardRef.update({ assignedTo: null });
+    await cardRef.update({
+      assignedTo: null,
+      status: cardStatus(null, card.data()?.sold === true),
+      updatedAt: Date.now(),
+    });
     const data = (await cardRef.get()).data() as any;
     const size = (data.gridSize as number) ?? 5;
     const numbers = data.numbers ? (data.numbers as number[][]) : expandGrid((data.numbersFlat as number[]) ?? [], size);
@@ -799,7 +891,7 @@ router.post('/:id/sold', async (req: any, res: any) => {
       return res.status(404).json({ error: 'Card not found' });
     }
 
-    await cardRef.update({ sold: true });
+    await cardRef.update({ sold: true, status: cardStatus(card.data()?.assignedTo, true), updatedAt: Date.now() });
     const data = (await cardRef.get()).data() as any;
     const size = (data.gridSize as number) ?? 5;
     const numbers = data.numbers ? (data.numbers as number[][]) : expandGrid((data.numbersFlat as number[]) ?? [], size);
@@ -816,83 +908,444 @@ router.post('/:id/sold', async (req: any, res: any) => {
   }
 });
 
-// Función para validar si una cartilla cumple con las reglas del BINGO
-function validateBingoCard(numbers: number[][]): boolean {
-  if (!numbers || numbers.length !== 5) return false;
+type GridIssue = 'shape' | 'range' | 'center' | 'duplicate';
+
+// Función para auditar una cartilla según las reglas del BINGO; devuelve los problemas encontrados
+function auditBingoGrid(numbers: number[][]): GridIssue[] {
+  if (!numbers || numbers.length !== 5 || numbers.some(row => !row || row.length !== 5)) {
+    return ['shape'];
+  }
 
+  const issues = new Set<GridIssue>();
   for (let col = 0; col < 5; col++) {
     const startNum = col * 15 + 1;
     const endNum = (col + 1) * 15;
+    const seen = new Set<number>();
 
     for (let row = 0; row < 5; row++) {
       // El centro es libre (número 0)
       if (row === 2 && col === 2) {
-        if (numbers[row][col] !== 0) return false;
+        if (numbers[row][col] !== 0) issues.add('center');
         continue;
       }
 
       const num = numbers[row][col];
       if (num < startNum || num > endNum) {
-        return false;
+        issues.add('range');
       }
+      if (seen.has(num)) {
+        issues.add('duplicate');
+      }
+      seen.add(num);
     }
   }
 
-  return true;
+  return Array.from(issues);
 }
 
-// Endpoint para validar y corregir cartillas existentes según las reglas del BINGO
-router.post('/validate-and-fix', async (_req: any, res: any) => {
+// Función para validar si una cartilla cumple con las reglas del BINGO
+function validateBingoCard(numbers: number[][]): boolean {
+  return auditBingoGrid(numbers).length === 0;
+}
+
+// Máximo de ejemplos guardados por tipo de problema en el reporte de auditoría
+const AUDIT_SAMPLE_LIMIT = 50;
+
+interface AuditReport {
+  scanned: number;
+  invalidGrid: {
+    count: number;
+    soldCount: number; // Vendidas: nunca se regeneran, requieren revisión manual
+    assignedCount: number; // Asignadas sin vender: pueden estar impresas/compartidas, revisión manual
+    byIssue: Record<GridIssue, number>;
+    samples: { id: string; cardNo: number; issues: GridIssue[]; sold: boolean; assignedTo: string | null }[];
+  };
+  duplicateCardNo: { count: number; samples: { cardNo: number; id: string }[] };
+  cardNoGaps: { missing: number; samples: { from: number; to: number }[] };
+  orphanedAssignments: { count: number; soldCount: number; samples: { id: string; cardNo: number; assignedTo: string; sold: boolean }[] };
+  statusMismatch: { count: number };
+  fixed: { regenerated: number; unassigned: number; statusUpdated: number };
+}
+
+function emptyAuditReport(): AuditReport {
+  return {
+    scanned: 0,
+    invalidGrid: { count: 0, soldCount: 0, assignedCount: 0, byIssue: { shape: 0, range: 0, center: 0, duplicate: 0 }, samples: [] },
+    duplicateCardNo: { count: 0, samples: [] },
+    cardNoGaps: { missing: 0, samples: [] },
+    orphanedAssignments: { count: 0, soldCount: 0, samples: [] },
+    statusMismatch: { count: 0 },
+    fixed: { regenerated: 0, unassigned: 0, statusUpdated: 0 },
+  };
+}
+
+function pushSample<T>(samples: T[], value: T) {
+  if (samples.length < AUDIT_SAMPLE_LIMIT) samples.push(value);
+}
+
+// Trabajo en segundo plano: auditoría de integridad de las cartillas de un evento.
+// Recorre events/{date}/cards por (cardNo, id) en páginas, así que la memoria es
+// constante: los duplicados y huecos de cardNo se detectan comparando con la
+// cartilla anterior y el reporte solo guarda contadores y ejemplos acotados.
+registerJobHandler('cards.audit', async (ctx) => {
+  const date = ctx.params.date as string;
+  const fix = ctx.params.fix === true;
+  const cardsCollectionRef = db.collection('events').doc(date).collection('cards');
+
+  if (ctx.progress.total == null) {
+    const countAggregation = await cardsCollectionRef.count().get();
+    await ctx.checkpoint({ total: countAggregation.data().count });
+  }
+
+  // Vendors existentes (solo ids) para detectar asignaciones huérfanas
+  const vendorsSnap = await db.collection('vendors').select().get();
+  const vendorIds = new Set(vendorsSnap.docs.map(d => d.id));
+
+  const report: AuditReport = ctx.progress.state.report ?? emptyAuditReport();
+  let cursor: { cardNo: number; id: string } | null = ctx.progress.state.cursor ?? null;
+
+  const writer = db.bulkWriter();
   try {
-    const existingCards = await db.collection('cards').get();
-    let correctedCount = 0;
-    let validCount = 0;
+    while (true) {
+      let query = cardsCollectionRef
+        .select('cardNo', 'numbersFlat', 'numbers', 'gridSize', 'assignedTo', 'sold', 'status')
+        .orderBy('cardNo', 'asc')
+        .orderBy(admin.firestore.FieldPath.documentId(), 'asc')
+        .limit(JOB_PAGE_SIZE);
+      if (cursor) query = query.startAfter(cursor.cardNo, cursor.id);
 
-    const BATCH_SIZE = 500;
-    const docsToUpdate: any[] = [];
+      const snapshot = await query.get();
+      if (snapshot.empty) break;
+
+      let failed = 0;
+      for (const doc of snapshot.docs) {
+        const data = doc.data();
+        const cardNo = data.cardNo as number;
+        const sold = data.sold === true;
+        const assignedTo = data.assignedTo as string | null | undefined;
+        const updates: Record<string, any> = {};
+
+        // 1. Números: rangos por columna, centro libre y repetidos en la columna
+        const size = (data.gridSize as number) ?? 5;
+        const numbers = data.numbers ? (data.numbers as number[][]) : expandGrid((data.numbersFlat as number[]) ?? [], size);
+        const issues = auditBingoGrid(numbers);
+        if (issues.length > 0) {
+          report.invalidGrid.count++;
+          if (sold) report.invalidGrid.soldCount++;
+          else if (assignedTo) report.invalidGrid.assignedCount++;
+          issues.forEach(issue => report.invalidGrid.byIssue[issue]++);
+          pushSample(report.invalidGrid.samples, { id: doc.id, cardNo, issues, sold, assignedTo: assignedTo ?? null });
+
+          // Solo se regeneran las que siguen en stock: una vendida está en manos del cliente
+          // y una asignada puede haberse compartido ya en PDF (/reports/share-assigned-cards)
+          if (fix && !sold && !assignedTo) {
+            Object.assign(updates, {
+              numbersFlat: flattenGrid(generateRandomBingoNumbers()),
+              gridSize: 5,
+              numbers: admin.firestore.FieldValue.delete(),
+              wasCorrected: true,
+            });
+            report.fixed.regenerated++;
+          }
+        }
+
+        // 2. cardNo: duplicados y huecos respecto a la cartilla anterior
+        const previousCardNo = cursor ? cursor.cardNo : 0;
+        if (cursor && cardNo === previousCardNo) {
+          report.duplicateCardNo.count++;
+          pushSample(report.duplicateCardNo.samples, { cardNo, id: doc.id });
+        } else if (cardNo > previousCardNo + 1) {
+          report.cardNoGaps.missing += cardNo - previousCardNo - 1;
+          pushSample(report.cardNoGaps.samples, { from: previousCardNo + 1, to: cardNo - 1 });
+        }
+
+        // 3. Asignaciones a vendors que ya no existen
+        if (assignedTo && !vendorIds.has(assignedTo)) {
+          report.orphanedAssignments.count++;
+          if (sold) report.orphanedAssignments.soldCount++;
+          pushSample(report.orphanedAssignments.samples, { id: doc.id, cardNo, assignedTo, sold });
+
+          // Solo se liberan las no vendidas; las vendidas requieren revisión manual
+          if (fix && !sold) {
+            updates.assignedTo = null;
+            report.fixed.unassigned++;
+          }
+        }
+
+        // 4. Estado denormalizado (también rellena `status` en cartillas anteriores a este campo)
+        const expectedStatus = cardStatus(updates.assignedTo === null ? null : assignedTo, sold);
+        if (data.status !== expectedStatus) {
+          if (!('assignedTo' in updates)) report.statusMismatch.count++;
+          if (fix) {
+            updates.status = expectedStatus;
+            report.fixed.statusUpdated++;
+          }
+        }
+
+        // Una sola escritura por cartilla con todas sus correcciones
+        if (Object.keys(updates).length > 0) {
+          writer.update(doc.ref, { ...updates, updatedAt: Date.now() }).catch(() => {
+            failed++;
+          });
+        }
+
+        cursor = { cardNo, id: doc.id };
+        report.scanned++;
+      }
+
+      // Las correcciones de cada página se escriben en paralelo antes de avanzar el checkpoint
+      await writer.flush();
+      if (failed > 0) {
+        throw new Error(`${failed} audit fixes failed; will resume from last checkpoint`);
+      }
+
+      await ctx.checkpoint({
+        processed: report.scanned,
+        state: { cursor, report },
+      });
+
+      if (snapshot.size < JOB_PAGE_SIZE) break;
+    }
+  } finally {
+    await writer.close();
+  }
+
+  // Las cartillas sin cardNo no aparecen en la consulta ordenada por cardNo
+  const missingCardNo = Math.max(0, (ctx.progress.total ?? report.scanned) - report.scanned);
+
+  return {
+    message: `Auditoría del evento ${date} completada`,
+    eventDate: date,
+    fix,
+    total: ctx.progress.total,
+    missingCardNo,
+    maxCardNo: cursor ? cursor.cardNo : 0,
+    ...report,
+    // Los números regenerados no se comparan con el resto de cartillas del evento
+    notes: report.fixed.regenerated > 0
+      ? ['Las cartillas regeneradas no se verificaron contra duplicados de otras cartillas del evento']
+      : [],
+  };
+});
 
-    for (const doc of existingCards.docs) {
-      const data = doc.data();
-      const currentNumbers = data.numbers ? (data.numbers as number[][]) : expandGrid((data.numbersFlat as number[]) ?? [], 5);
+// Trabajo en segundo plano: validar y corregir cartillas de la colección legacy `cards`
+registerJobHandler('cards.validateAndFix', async (ctx) => {
+  const cardsCollectionRef = db.collection('cards');
+  const state = ctx.progress.state;
+  let cursor: string | null = state.cursor ?? null;
+  let correctedCount: number = state.corrected ?? 0;
+  let validCount: number = state.valid ?? 0;
 
-      const isValid = validateBingoCard(currentNumbers);
+  const writer = db.bulkWriter();
+  try {
+    while (true) {
+      let query = cardsCollectionRef
+        .orderBy(admin.firestore.FieldPath.documentId())
+        .limit(JOB_PAGE_SIZE);
+      if (cursor) query = query.startAfter(cursor);
+
+      const snapshot = await query.get();
+      if (snapshot.empty) break;
 
-      if (!isValid) {
-        const newNumbers = generateRandomBingoNumbers();
-        const newFlat = flattenGrid(newNumbers);
+      let failed = 0;
+      for (const doc of snapshot.docs) {
+        const data = doc.data();
+        const currentNumbers = data.numbers ? (data.numbers as number[][]) : expandGrid((data.numbersFlat as number[]) ?? [], 5);
 
-        docsToUpdate.push({
-          ref: doc.ref,
-          data: {
+        if (!validateBingoCard(currentNumbers)) {
+          const newFlat = flattenGrid(generateRandomBingoNumbers());
+          writer.update(doc.ref, {
             numbersFlat: newFlat,
             updatedAt: Date.now(),
             wasCorrected: true,
-          }
-        });
-
-        correctedCount++;
-      } else {
-        validCount++;
+          }).catch(() => {
+            failed++;
+          });
+          correctedCount++;
+        } else {
+          validCount++;
+        }
+      }
+      await writer.flush();
+      if (failed > 0) {
+        throw new Error(`${failed} updates failed; will resume from last checkpoint`);
       }
+
+      cursor = snapshot.docs[snapshot.docs.length - 1].id;
+      await ctx.checkpoint({
+        processed: ctx.progress.processed + snapshot.size,
+        state: { cursor, corrected: correctedCount, valid: validCount },
+      });
+
+      if (snapshot.size < JOB_PAGE_SIZE) break;
     }
+  } finally {
+    await writer.close();
+  }
 
-    // Procesar actualizaciones en batches
-    for (let i = 0; i < docsToUpdate.length; i += BATCH_SIZE) {
-      const batch = db.batch();
-      const chunk = docsToUpdate.slice(i, i + BATCH_SIZE);
+  return {
+    message: 'Validación y corrección completada',
+    corrected: correctedCount,
+    valid: validCount,
+    total: correctedCount + validCount,
+  };
+});
+
+// Endpoint de auditoría de integridad de un evento (números, cardNo, asignaciones huérfanas y `status`)
+// Con fix=true corrige lo que se puede corregir automáticamente. Responde 202 con el jobId;
+// el reporte queda en el resultado de GET /api/jobs/:id
+router.post('/audit', async (req: any, res: any) => {
+  try {
+    const { date, fix = false } = req.body as { date?: string; fix?: boolean };
+
+    if (!date) {
+      return res.status(400).json({
+        error: 'El parámetro "date" es requerido (formato: YYYY-MM-DD)'
+      });
+    }
+
+    const jobId = await enqueueJob('cards.audit', { date, fix: fix === true });
+    return res.status(202).json({
+      message: `Auditoría del evento ${date} encolada`,
+      jobId,
+      status: 'queued',
+      eventDate: date,
+    });
+  } catch (e: any) {
+    return res.status(500).json({ error: e.message });
+  }
+});
+
+// Marca de migración por evento: `migrations/cardsStatus_{date}` existe cuando todas
+// sus cartillas tienen `status`. Se cachea en memoria (1 lectura por instancia y evento);
+// el resultado negativo se vuelve a consultar pasado STATUS_BACKFILL_RECHECK_MS.
+const STATUS_BACKFILL_RECHECK_MS = 60 * 1000;
+const statusBackfillCache = new Map<string, { done: boolean; checkedAt: number }>();
+
+function statusBackfillRef(date: string) {
+  return db.collection('migrations').doc(`cardsStatus_${date}`);
+}
+
+async function isStatusBackfilled(date: string): Promise<boolean> {
+  const cached = statusBackfillCache.get(date);
+  if (cached && (cached.done || Date.now() - cached.checkedAt < STATUS_BACKFILL_RECHECK_MS)) {
+    return cached.done;
+  }
+  const snap = await statusBackfillRef(date).get();
+  statusBackfillCache.set(date, { done: snap.exists, checkedAt: Date.now() });
+  return snap.exists;
+}
+
+// Crear la marca: desde aquí GET /cards filtra este evento por `status`
+async function markStatusBackfilled(date: string, source: 'backfill' | 'generate', updated: number = 0) {
+  await statusBackfillRef(date).set({ eventDate: date, source, updated, completedAt: Date.now() });
+  statusBackfillCache.set(date, { done: true, checkedAt: Date.now() });
+}
+
+// Trabajo en segundo plano: migración que solo rellena/corrige `status` en events/{date}/cards.
+// No toca números, asignaciones ni `updatedAt` (status no viaja a la caché del cliente),
+// así que es seguro ejecutarlo en un evento en curso. Pagina por id para incluir
+// también las cartillas sin cardNo.
+registerJobHandler('cards.backfillStatus', async (ctx) => {
+  const date = ctx.params.date as string;
+  const cardsCollectionRef = db.collection('events').doc(date).collection('cards');
+
+  if (ctx.progress.total == null) {
+    const countAggregation = await cardsCollectionRef.count().get();
+    await ctx.checkpoint({ total: countAggregation.data().count });
+  }
+
+  let cursor: string | null = ctx.progress.state.cursor ?? null;
+  let updated: number = ctx.progress.state.updated ?? 0;
+
+  const writer = db.bulkWriter();
+  try {
+    while (true) {
+      let query = cardsCollectionRef
+        .select('assignedTo', 'sold', 'status')
+        .orderBy(admin.firestore.FieldPath.documentId())
+        .limit(JOB_PAGE_SIZE);
+      if (cursor) query = query.startAfter(cursor);
+
+      const snapshot = await query.get();
+      if (snapshot.empty) break;
+
+      let failed = 0;
+      for (const doc of snapshot.docs) {
+        const data = doc.data();
+        const expectedStatus = cardStatus(data.assignedTo ?? null, data.sold === true);
+        if (data.status !== expectedStatus) {
+          writer.update(doc.ref, { status: expectedStatus }).catch(() => {
+            failed++;
+          });
+          updated++;
+        }
+      }
+
+      await writer.flush();
+      if (failed > 0) {
+        throw new Error(`${failed} status updates failed; will resume from last checkpoint`);
+      }
 
-      chunk.forEach(({ ref, data }) => {
-        batch.update(ref, data);
+      cursor = snapshot.docs[snapshot.docs.length - 1].id;
+      await ctx.checkpoint({
+        processed: ctx.progress.processed + snapshot.size,
+        state: { cursor, updated },
       });
 
-      await batch.commit();
+      if (snapshot.size < JOB_PAGE_SIZE) break;
     }
+  } finally {
+    await writer.close();
+  }
 
-    return res.status(200).json({
-      message: 'Validación y corrección completada',
-      corrected: correctedCount,
-      valid: validCount,
-      total: correctedCount + validCount,
+  await markStatusBackfilled(date, 'backfill', updated);
+
+  return {
+    message: `Campo status actualizado en ${updated} cartillas del evento ${date}`,
+    eventDate: date,
+    scanned: ctx.progress.processed,
+    updated,
+  };
+});
+
+// Endpoint de migración: rellenar `status` en las cartillas de un evento.
+// Hasta que termina, GET /cards filtra ese evento por `assignedTo` (ver isStatusBackfilled).
+router.post('/backfill-status', async (req: any, res: any) => {
+  try {
+    const { date } = req.body as { date?: string };
+
+    if (!date) {
+      return res.status(400).json({
+        error: 'El parámetro "date" es requerido (formato: YYYY-MM-DD)'
+      });
+    }
+
+    const jobId = await enqueueJob('cards.backfillStatus', { date });
+    return res.status(202).json({
+      message: `Migración de status del evento ${date} encolada`,
+      jobId,
+      status: 'queued',
+      eventDate: date,
+    });
+  } catch (e: any) {
+    return res.status(500).json({ error: e.message });
+  }
+});
+
+// Endpoint para validar y corregir cartillas existentes según las reglas del BINGO
+// Con date: auditoría con corrección de events/{date}/cards. Sin date: colección legacy `cards`.
+// Encola un trabajo y responde 202 con el jobId; el resultado queda en GET /api/jobs/:id
+router.post('/validate-and-fix', async (req: any, res: any) => {
+  try {
+    const date = (req.body?.date ?? req.query?.date) as string | undefined;
+    const jobId = date
+      ? await enqueueJob('cards.audit', { date, fix: true })
+      : await enqueueJob('cards.validateAndFix', {});
+    return res.status(202).json({
+      message: 'Validación y corrección encolada',
+      jobId,
+      status: 'queued',
     });
   } catch (e: any) {
     return res.status(500).json({ error: e.message });
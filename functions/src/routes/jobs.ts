@@ -0,0 +1,33 @@
+import { Router } from 'express';
+import { getJob, resumeJob } from '../jobs/jobQueue';
+
+export const router = Router();
+
+// Estado y progreso de un trabajo en segundo plano
+router.get('/:id', async (req: any, res: any) => {
+  try {
+    const job = await getJob(req.params.id);
+    if (!job) return res.status(404).json({ error: 'Job not found' });
+    return res.json(job);
+  } catch (e: any) {
+    return res.status(500).json({ error: e.message });
+  }
+});
+
+// Re-despachar un trabajo que quedó en `failed` o cuyo worker murió con el lease
+// tomado (continúa desde su checkpoint). Cualquier otro estado responde 409.
+router.post('/:id/resume', async (req: any, res: any) => {
+  try {
+    const resumed = await resumeJob(req.params.id);
+    if (!resumed) return res.status(404).json({ error: 'Job not found' });
+    const { job, dispatched } = resumed;
+    if (!dispatched) {
+      return res.status(409).json({ error: `Job is ${job.status}; only failed or stalled jobs can be resumed`, job });
+    }
+    return res.status(202).json({ jobId: job.id, status: job.status });
+  } catch (e: any) {
+    return res.status(500).json({ error: e.message });
+  }
+});
+
+export default router;
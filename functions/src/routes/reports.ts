@@ -1,6 +1,7 @@
 import { Router } from 'express';
 import { z } from 'zod';
 import { db, bucket } from '../index';
+import { registerJobHandler, enqueueJob, deleteQueryWithCheckpoints } from '../jobs/jobQueue';
 import { PDFDocument, rgb, StandardFonts } from 'pdf-lib';
 import * as os from 'os';
 import * as path from 'path';
@@ -215,7 +216,35 @@ router.get('/vendors-summary', async (req: any, res: any) => {
   }
 });
 
+// Background job: delete sales and balances (optionally for a single vendor)
+registerJobHandler('reports.clearCommissions', async (ctx) => {
+  const vendorId = ctx.params.vendorId as string | undefined;
+
+  let salesQuery: FirebaseFirestore.Query = db.collection('sales');
+  let balancesQuery: FirebaseFirestore.Query = db.collection('balances');
+  if (vendorId) {
+    salesQuery = salesQuery.where('sellerId', '==', vendorId);
+    balancesQuery = balancesQuery.where('vendorId', '==', vendorId);
+  }
+
+  const salesDeleted = await deleteQueryWithCheckpoints(ctx, 'sales', salesQuery);
+  const balancesDeleted = await deleteQueryWithCheckpoints(ctx, 'balances', balancesQuery);
+
+  console.log(`✅ DATA DELETION COMPLETE. Sales: ${salesDeleted}, Balances: ${balancesDeleted}`);
+
+  return {
+    success: true,
+    summary: {
+      salesDeleted,
+      balancesDeleted,
+      totalRecordsDeleted: salesDeleted + balancesDeleted,
+      timestamp: Date.now()
+    }
+  };
+});
+
 // Endpoint to clear all sales and balances data
+// Enqueues a job and returns 202 with its jobId; poll GET /api/jobs/:id for the summary
 router.post('/clear-commissions', async (req: any, res: any) => {
   try {
     const { confirm, vendorId } = req.body;
@@ -226,50 +255,11 @@ router.post('/clear-commissions', async (req: any, res: any) => {
 
     console.log(`🚨 STARTING DATA DELETION: Sales and Balances ${vendorId ? `for vendor ${vendorId}` : '(ALL DATA)'}`);
 
-    const deleteCollection = async (collectionPath: string) => {
-      let totalDeleted = 0;
-      let query: FirebaseFirestore.Query = db.collection(collectionPath);
-
-      if (vendorId) {
-        // If filtering by vendor, we need to check the field names
-        if (collectionPath === 'sales') {
-          query = query.where('sellerId', '==', vendorId);
-        } else if (collectionPath === 'balances') {
-          query = query.where('vendorId', '==', vendorId);
-        }
-      }
-
-      while (true) {
-        const snapshot = await query.limit(500).get();
-        if (snapshot.empty) break;
-
-        const batch = db.batch();
-        snapshot.docs.forEach(doc => batch.delete(doc.ref));
-        await batch.commit();
-
-        totalDeleted += snapshot.size;
-        console.log(`Deleted ${snapshot.size} docs from ${collectionPath}`);
-      }
-      return totalDeleted;
-    };
-
-    const salesDeleted = await deleteCollection('sales');
-    const balancesDeleted = await deleteCollection('balances');
-
-    console.log(`✅ DATA DELETION COMPLETE. Sales: ${salesDeleted}, Balances: ${balancesDeleted}`);
-
-    return res.json({
-      success: true,
-      summary: {
-        salesDeleted,
-        balancesDeleted,
-        totalRecordsDeleted: salesDeleted + balancesDeleted,
-        timestamp: Date.now()
-      }
-    });
+    const jobId = await enqueueJob('reports.clearCommissions', vendorId ? { vendorId } : {});
 
+    return res.status(202).json({ success: true, jobId, status: 'queued' });
   } catch (e: any) {
     console.error('Error clearing data:', e);
     return res.status(500).json({ error: e.message });
   }
-});
\ No newline at end of file
+});
@@ -1,6 +1,7 @@
 import { Router } from 'express';
 import { z } from 'zod';
 import { db } from '../index';
+import { cardStatus } from './cards';
 
 const saleSchema = z.object({
   cardId: z.string(),
@@ -81,7 +82,12 @@ router.post('/', async (req: any, res: any) => {
       t.set(saleRef, saleData);
 
       // 5. Actualizar Cartilla
-      t.update(cardRef, { sold: true, saleId: saleRef.id });
+      t.update(cardRef, {
+        sold: true,
+        saleId: saleRef.id,
+        status: cardStatus(cardData.assignedTo, true),
+        updatedAt: Date.now(),
+      });
 
       // 6. Registrar Balances (Comisiones)
       // Balance del Vendedor
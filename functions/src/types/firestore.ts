@@ -2,6 +2,9 @@ import type { Query } from 'firebase-admin/firestore';
 
 export type FirestoreQuery = Query;
 
+// Estado denormalizado de una cartilla: libre, asignada o vendida (con el vendor)
+export type CardStatus = 'free' | `assigned:${string}` | `sold:${string}`;
+
 export interface CardDoc {
     id: string;
     numbers?: number[][]; // 5x5 (returned by API)
@@ -10,7 +13,9 @@ export interface CardDoc {
     eventId: string; // FK to event - NUEVO
     assignedTo?: string; // vendorId
     sold: boolean;
+    status?: CardStatus; // Denormalizado de (assignedTo, sold)
     createdAt: number;
+    updatedAt?: number; // Última escritura (watermark para sincronización incremental)
     cardNo?: number; // Número secuencial de cartilla
     date?: string; // Fecha del evento (YYYY-MM-DD)
 }
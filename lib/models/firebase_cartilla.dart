@@ -8,6 +8,7 @@ class FirebaseCartilla {
   final String? assignedTo;
   final bool sold;
   final int createdAt;
+  final int? updatedAt; // Última escritura en el backend (watermark de sincronización)
   final int? cardNo;
 
   FirebaseCartilla({
@@ -18,6 +19,7 @@ class FirebaseCartilla {
     this.assignedTo,
     required this.sold,
     required this.createdAt,
+    this.updatedAt,
     this.cardNo,
   });
 
@@ -67,6 +69,7 @@ class FirebaseCartilla {
         assignedTo: json['assignedTo'] as String?,
         sold: json['sold'] as bool? ?? false,
         createdAt: json['createdAt'] as int? ?? 0,
+        updatedAt: json['updatedAt'] as int?,
         cardNo: json['cardNo'] as int?,
       );
       
@@ -90,6 +93,7 @@ class FirebaseCartilla {
       'assignedTo': assignedTo,
       'sold': sold,
       'createdAt': createdAt,
+      if (updatedAt != null) 'updatedAt': updatedAt,
       if (cardNo != null) 'cardNo': cardNo,
     };
   }
@@ -2,6 +2,7 @@ import 'package:flutter/foundation.dart';
 import '../models/bingo_game.dart';
 import '../models/firebase_cartilla.dart';
 import '../services/cartillas_service.dart';
+import '../services/cartillas_cache_service.dart';
 import '../utils/debug_logger.dart';
 import 'game_state_provider.dart';
 import 'ui_state_provider.dart';
@@ -73,8 +74,8 @@ class AppProvider extends ChangeNotifier {
     if (_selectedDate != date) {
       _selectedDate = date;
       debugLog('Fecha cambiada a: $date');
-      // Recargar cartillas para la nueva fecha
-      loadFirebaseCartillas();
+      // Recargar cartillas para la nueva fecha (desde la caché local + cambios)
+      loadFirebaseCartillas(reset: true);
       notifyListeners();
     }
   }
@@ -190,6 +191,12 @@ class AppProvider extends ChangeNotifier {
       await loadVendors();
       debugLog('Vendedores cargados antes de cartillas: ${vendors.length}');
       
+      // Sin filtros: usar la caché local del evento y traer solo los cambios
+      if (assignedTo == null && sold == null) {
+        await _loadCartillasFromCache();
+        return;
+      }
+      
       // Cargar todas las cartillas de Firebase con paginación automática
       // OPTIMIZADO: Usa límite de 50 por página para reducir lecturas de Firestore
       final cartillasData = await CartillaService.getAllCartillas(
@@ -248,6 +255,34 @@ class AppProvider extends ChangeNotifier {
     }
   }
   
+  // Cargar las cartillas del evento desde la caché en disco y luego sincronizar solo los cambios
+  Future<void> _loadCartillasFromCache() async {
+    final date = _selectedDate;
+    
+    // 1. Mostrar inmediatamente lo que haya en disco
+    final cached = await CartillasCacheService.loadCached(date);
+    if (cached.isNotEmpty && date == _selectedDate) {
+      _setAllFirebaseCartillas(cached);
+      debugLog('Cartillas cargadas desde caché local: ${cached.length}');
+      await _syncFirebaseWithLocal();
+      notifyListeners();
+    }
+    
+    // 2. Traer del backend solo lo que cambió desde el último watermark
+    final synced = await CartillasCacheService.sync(date);
+    if (date != _selectedDate) return; // La fecha cambió mientras sincronizábamos
+    _setAllFirebaseCartillas(synced);
+    debugLog('Cartillas sincronizadas con el backend: ${synced.length}');
+    await _syncFirebaseWithLocal();
+  }
+  
+  void _setAllFirebaseCartillas(List<FirebaseCartilla> cartillas) {
+    _allFirebaseCartillas = cartillas.where((c) => c.isValidStructure).toList();
+    _hasMoreData = false;
+    if (_currentPage < 1) _currentPage = 1;
+    _updateVisibleCartillas();
+  }
+  
   // Actualizar las cartillas visibles basado en la página actual
   void _updateVisibleCartillas() {
     try {
@@ -595,6 +630,8 @@ class AppProvider extends ChangeNotifier {
       final result = await CartillaService.clearAllCartillas(date: _selectedDate);
       
       if (result != null) {
+        await CartillasCacheService.clear(_selectedDate);
+        
         // Limpiar todas las listas locales
         _firebaseCartillas.clear();
         _allFirebaseCartillas.clear();
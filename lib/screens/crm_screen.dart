@@ -15,6 +15,7 @@ import '../providers/app_provider.dart';
 import 'package:url_launcher/url_launcher.dart';
 import 'package:font_awesome_flutter/font_awesome_flutter.dart';
 import '../services/cartillas_service.dart';
+import '../services/jobs_service.dart';
 import '../services/storage_service.dart';
 import '../utils/pdf_generator.dart';
 
@@ -193,7 +194,7 @@ class _CrmScreenState extends State<CrmScreen> {
           final pagination = responseData['pagination'] as Map<String, dynamic>?;
           
           cards.addAll(pageCards);
-          lastDocId = pagination?['lastDocId'] as String?;
+          lastDocId = pagination?['lastCardNo']?.toString() ?? pagination?['lastDocId'] as String?; // Cursor keyset por cardNo
           
           if (pagination?['hasMore'] == true && lastDocId != null) {
             await loadCardsPage();
@@ -736,7 +737,7 @@ class _CrmScreenState extends State<CrmScreen> {
         final pagination = responseData['pagination'] as Map<String, dynamic>?;
         
         cards.addAll(pageCards);
-        lastDocId = pagination?['lastDocId'] as String?;
+        lastDocId = pagination?['lastCardNo']?.toString() ?? pagination?['lastDocId'] as String?; // Cursor keyset por cardNo
         
         // Si hay más páginas, cargar la siguiente
         if (pagination?['hasMore'] == true && lastDocId != null) {
@@ -1088,13 +1089,17 @@ class _CrmScreenState extends State<CrmScreen> {
          }),
        );
 
+      // Esperar a que termine el trabajo de eliminación encolado en el backend
+      final result = response.statusCode == 200 || response.statusCode == 202
+          ? await JobsService.resolveResponse(response)
+          : null;
+
       // Cerrar diálogo de progreso
       Navigator.pop(context);
 
       if (!mounted) return;
 
-      if (response.statusCode == 200) {
-        final result = json.decode(response.body);
+      if (result != null) {
         final summary = result['summary'];
         
                  // Mostrar resumen de la operación
@@ -2121,7 +2126,7 @@ class _CrmScreenState extends State<CrmScreen> {
         final pagination = responseData['pagination'] as Map<String, dynamic>?;
         
         cards.addAll(pageCards);
-        lastDocId = pagination?['lastDocId'] as String?;
+        lastDocId = pagination?['lastCardNo']?.toString() ?? pagination?['lastDocId'] as String?; // Cursor keyset por cardNo
         
         // Si hay más páginas, cargar la siguiente
         if (pagination?['hasMore'] == true && lastDocId != null) {
@@ -2157,7 +2162,7 @@ class _CrmScreenState extends State<CrmScreen> {
               final pagination = responseData['pagination'] as Map<String, dynamic>?;
               
               cards.addAll(pageCards);
-              pageLastDocId = pagination?['lastDocId'] as String?;
+              pageLastDocId = pagination?['lastCardNo']?.toString() ?? pagination?['lastDocId'] as String?; // Cursor keyset por cardNo
               
               // Si hay más páginas, cargar la siguiente
               if (pagination?['hasMore'] == true && pageLastDocId != null) {
@@ -3411,11 +3416,38 @@ class _CrmScreenState extends State<CrmScreen> {
 
     if (finalConfirm != 'ELIMINAR_DATOS_2024') return;
 
+    // Progreso del trabajo en segundo plano que elimina los datos
+    final progressText = ValueNotifier<String>('Eliminando datos de $vendorName...');
+    bool loadingOpen = true;
+    void closeLoading() {
+      if (loadingOpen) {
+        loadingOpen = false;
+        Navigator.pop(context);
+      }
+    }
+
     try {
       showDialog(
         context: context,
         barrierDismissible: false,
-        builder: (context) => Center(child: CircularProgressIndicator()),
+        builder: (context) => Center(
+          child: Card(
+            child: Padding(
+              padding: EdgeInsets.all(24),
+              child: Column(
+                mainAxisSize: MainAxisSize.min,
+                children: [
+                  CircularProgressIndicator(),
+                  SizedBox(height: 16),
+                  ValueListenableBuilder<String>(
+                    valueListenable: progressText,
+                    builder: (context, text, _) => Text(text),
+                  ),
+                ],
+              ),
+            ),
+          ),
+        ),
       );
 
       final resp = await http.post(
@@ -3428,10 +3460,20 @@ class _CrmScreenState extends State<CrmScreen> {
         }),
       );
 
-      Navigator.pop(context); // Cerrar loading
+      final result = resp.statusCode < 300
+          ? await JobsService.resolveResponse(
+              resp,
+              onProgress: (processed, total) {
+                progressText.value = total != null
+                    ? 'Eliminando datos de $vendorName... $processed / $total'
+                    : 'Eliminando datos de $vendorName... $processed registros';
+              },
+            )
+          : null;
 
-      if (resp.statusCode < 300) {
-        final result = json.decode(resp.body);
+      closeLoading();
+
+      if (result != null) {
         final summary = result['summary'];
         
         await showDialog(
@@ -3472,12 +3514,16 @@ class _CrmScreenState extends State<CrmScreen> {
         throw Exception(error['error'] ?? 'Error desconocido');
       }
     } catch (e) {
+      // El trabajo puede fallar o agotar el tiempo de espera: cerrar siempre el loading
+      closeLoading();
       ScaffoldMessenger.of(context).showSnackBar(
         SnackBar(
           content: Text('Error al eliminar datos: $e'),
           backgroundColor: Colors.red,
         ),
       );
+    } finally {
+      progressText.dispose();
     }
   }
 
@@ -5085,7 +5131,7 @@ class _AssignedCardsDialogState extends State<_AssignedCardsDialog> {
           final pagination = responseData['pagination'] as Map<String, dynamic>?;
           
           targetList.addAll(pageCards);
-          lastDocId = pagination?['lastDocId'] as String?;
+          lastDocId = pagination?['lastCardNo']?.toString() ?? pagination?['lastDocId'] as String?; // Cursor keyset por cardNo
           
           // Si hay más páginas, cargar la siguiente
           if (pagination?['hasMore'] == true && lastDocId != null) {
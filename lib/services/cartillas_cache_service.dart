@@ -0,0 +1,139 @@
+import 'package:flutter/foundation.dart';
+import 'package:hive_flutter/hive_flutter.dart';
+import '../models/firebase_cartilla.dart';
+import 'cartillas_service.dart';
+
+/// Caché local persistente de las cartillas de cada evento.
+///
+/// Cada evento (fecha) tiene su propia caja de Hive con las cartillas indexadas
+/// por id de documento (único, a diferencia de cardNo), y una caja de metadatos guarda el watermark (`updatedAt` más alto
+/// visto) por fecha. Al abrir la app se muestran las cartillas desde disco y solo
+/// se piden al backend las que cambiaron después del watermark (asignaciones,
+/// ventas). Si el total del backend no coincide con la caché (p. ej. cartillas
+/// eliminadas) se hace una resincronización completa.
+class CartillasCacheService {
+  static const String _metaBoxName = 'cartillas_sync_meta';
+
+  // Margen para no perder escrituras concurrentes con timestamp cercano al watermark.
+  // Necesario para la corrección: el backend asigna updatedAt antes de confirmar cada escritura.
+  static const int _syncOverlapMs = 60 * 1000;
+
+  static Future<void>? _initFuture;
+
+  static Future<void> _ensureInitialized() {
+    return _initFuture ??= Hive.initFlutter();
+  }
+
+  static String _boxName(String date) => 'cartillas_$date';
+
+  static Future<Box> _openBox(String date) async {
+    await _ensureInitialized();
+    return Hive.openBox(_boxName(date));
+  }
+
+  static Future<Box> _openMetaBox() async {
+    await _ensureInitialized();
+    return Hive.openBox(_metaBoxName);
+  }
+
+  // Clave de la cartilla en la caja: id del documento. Con cardNo como clave, dos
+  // cartillas con el mismo número ocupaban una sola entrada y el conteo nunca cuadraba.
+  static String _keyFor(Map<String, dynamic> card) => card['id'] as String;
+
+  // Cajas de versiones anteriores indexadas por cardNo (claves int): requieren resincronizar
+  static bool _hasLegacyKeys(Box box) => box.keys.any((key) => key is int);
+
+  static List<FirebaseCartilla> _readAll(Box box) {
+    final cartillas = <FirebaseCartilla>[];
+    for (final value in box.values) {
+      try {
+        cartillas.add(FirebaseCartilla.fromJson(Map<String, dynamic>.from(value as Map)));
+      } catch (e) {
+        if (kDebugMode) {
+          print('Cartilla en caché inválida: $e');
+        }
+      }
+    }
+    cartillas.sort((a, b) => (a.cardNo ?? 1 << 30).compareTo(b.cardNo ?? 1 << 30));
+    return cartillas;
+  }
+
+  static Future<void> _putAll(Box box, List<Map<String, dynamic>> cards) async {
+    await box.putAll({for (final card in cards) _keyFor(card): card});
+  }
+
+  /// Cartillas guardadas en disco para [date] (vacío si nunca se sincronizó)
+  static Future<List<FirebaseCartilla>> loadCached(String date) async {
+    try {
+      final box = await _openBox(date);
+      return _readAll(box);
+    } catch (e) {
+      if (kDebugMode) {
+        print('Error leyendo caché de cartillas: $e');
+      }
+      return [];
+    }
+  }
+
+  /// Sincroniza la caché de [date] con el backend y devuelve todas las cartillas.
+  /// Usa sincronización incremental si ya hay watermark; completa en caso contrario.
+  static Future<List<FirebaseCartilla>> sync(String date) async {
+    final box = await _openBox(date);
+    final meta = await _openMetaBox();
+    final watermark = meta.get(date) as int?;
+
+    if (watermark == null || box.isEmpty || _hasLegacyKeys(box)) {
+      return _fullSync(date, box, meta);
+    }
+
+    final since = watermark > _syncOverlapMs ? watermark - _syncOverlapMs : 0;
+    final changes = await CartillaService.getCartillaChanges(date: date, since: since);
+    final changedCards = (changes['cards'] as List).cast<Map<String, dynamic>>();
+    await _putAll(box, changedCards);
+
+    // Una entrada por documento: si el total no coincide hubo eliminaciones, resincronizar
+    if (box.length != changes['total']) {
+      if (kDebugMode) {
+        print('Caché de $date desincronizada (${box.length} vs ${changes['total']}), resincronizando');
+      }
+      return _fullSync(date, box, meta);
+    }
+
+    final newWatermark = changes['watermark'] as int;
+    if (newWatermark > watermark) {
+      await meta.put(date, newWatermark);
+    }
+
+    if (kDebugMode) {
+      print('Caché de $date: ${changedCards.length} cartilla(s) actualizada(s) desde $since');
+    }
+    return _readAll(box);
+  }
+
+  static Future<List<FirebaseCartilla>> _fullSync(String date, Box box, Box meta) async {
+    final cards = await CartillaService.getAllCartillas(date: date, limitPerPage: 500);
+
+    int watermark = 0;
+    for (final card in cards) {
+      final stamp = card['updatedAt'] as int? ?? card['createdAt'] as int? ?? 0;
+      if (stamp > watermark) watermark = stamp;
+    }
+
+    await box.clear();
+    await _putAll(box, cards);
+    await meta.put(date, watermark);
+
+    if (kDebugMode) {
+      print('Caché de $date resincronizada: ${cards.length} cartilla(s)');
+    }
+    return _readAll(box);
+  }
+
+  /// Eliminar la caché de [date] (p. ej. después de borrar todas sus cartillas)
+  static Future<void> clear(String date) async {
+    final box = await _openBox(date);
+    final meta = await _openMetaBox();
+    await box.clear();
+    await meta.delete(date);
+  }
+}
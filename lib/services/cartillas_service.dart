@@ -3,6 +3,7 @@ import 'dart:async';
 import 'package:flutter/foundation.dart';
 import 'package:http/http.dart' as http;
 import '../config/backend_config.dart';
+import 'jobs_service.dart';
 
 class CartillaService {
   // Obtener todas las cartillas con paginación
@@ -50,7 +51,7 @@ class CartillaService {
     int limitPerPage = 50, // Reducido de 2000 a 50 para optimizar lecturas
   }) async {
     final allCards = <Map<String, dynamic>>[];
-    String? lastDocId;
+    String? cursor; // cardNo de la última cartilla (paginación keyset)
     bool hasMore = true;
     
     while (hasMore) {
@@ -60,7 +61,7 @@ class CartillaService {
       };
       if (assignedTo != null) queryParams['assignedTo'] = assignedTo;
       if (sold != null) queryParams['sold'] = sold.toString();
-      if (lastDocId != null) queryParams['startAfter'] = lastDocId;
+      if (cursor != null) queryParams['startAfter'] = cursor;
       
       final uri = Uri.parse(BackendConfig.cardsUrl).replace(queryParameters: queryParams);
       
@@ -82,9 +83,10 @@ class CartillaService {
       
       // Verificar si hay más páginas
       final hasMorePages = pagination?['hasMore'] as bool? ?? false;
-      lastDocId = pagination?['lastDocId'] as String?;
+      final lastCardNo = pagination?['lastCardNo'];
+      cursor = lastCardNo != null ? lastCardNo.toString() : pagination?['lastDocId'] as String?;
       
-      if (!hasMorePages || lastDocId == null || pageCards.isEmpty) {
+      if (!hasMorePages || cursor == null || pageCards.isEmpty) {
         hasMore = false;
       }
     }
@@ -92,6 +94,56 @@ class CartillaService {
     return allCards;
   }
   
+  // Obtener las cartillas modificadas después de [since] (ms epoch) para sincronización incremental.
+  // Devuelve {cards, watermark, total}; recorre todas las páginas del cursor.
+  static Future<Map<String, dynamic>> getCartillaChanges({
+    required String date,
+    required int since,
+    int limitPerPage = 500,
+  }) async {
+    final changedCards = <Map<String, dynamic>>[];
+    int watermark = since;
+    int total = 0;
+    String? cursor;
+    bool hasMore = true;
+
+    while (hasMore) {
+      final queryParams = <String, String>{
+        'date': date,
+        'since': since.toString(),
+        'limit': limitPerPage.toString(),
+      };
+      if (cursor != null) queryParams['cursor'] = cursor;
+
+      final uri = Uri.parse('${BackendConfig.cardsUrl}/changes').replace(queryParameters: queryParams);
+
+      final response = await _makeRequestWithRetry(() => http.get(
+        uri,
+        headers: BackendConfig.defaultHeaders,
+      ).timeout(BackendConfig.connectionTimeout));
+
+      if (response.statusCode != 200) {
+        throw Exception('Error al obtener cambios de cartillas: ${response.statusCode} - ${response.body}');
+      }
+
+      final responseData = json.decode(response.body) as Map<String, dynamic>;
+      changedCards.addAll((responseData['cards'] as List<dynamic>? ?? []).cast<Map<String, dynamic>>());
+      final pageWatermark = responseData['watermark'] as int? ?? since;
+      if (pageWatermark > watermark) watermark = pageWatermark;
+      total = responseData['total'] as int? ?? total;
+
+      final pagination = responseData['pagination'] as Map<String, dynamic>?;
+      cursor = pagination?['cursor'] as String?;
+      hasMore = (pagination?['hasMore'] as bool? ?? false) && cursor != null;
+    }
+
+    return {
+      'cards': changedCards,
+      'watermark': watermark,
+      'total': total,
+    };
+  }
+  
   // Crear una nueva cartilla
   static Future<Map<String, dynamic>> createCartilla(List<List<int>> numbers, {int? cardNo}) async {
     return _makeRequestWithRetry(() async {
@@ -221,9 +273,9 @@ class CartillaService {
         ),
       );
       
-      if (response.statusCode == 200) {
-        final responseData = json.decode(response.body);
-        return responseData;
+      if (response.statusCode == 200 || response.statusCode == 202) {
+        // El backend encola la eliminación como trabajo; esperar a que termine
+        return await JobsService.resolveResponse(response);
       } else {
         if (kDebugMode) {
           print('Error eliminando todas las cartillas: ${response.statusCode}');
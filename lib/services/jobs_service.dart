@@ -0,0 +1,75 @@
+import 'dart:convert';
+import 'package:flutter/foundation.dart';
+import 'package:http/http.dart' as http;
+import '../config/backend_config.dart';
+
+/// Servicio para consultar los trabajos en segundo plano del backend
+/// (eliminación masiva de cartillas, limpieza de comisiones, etc.)
+class JobsService {
+  static String get _jobsEndpoint => '${BackendConfig.apiBase}/jobs';
+
+  static const Duration pollInterval = Duration(seconds: 2);
+  static const Duration maxWait = Duration(minutes: 15);
+
+  /// Obtener el estado de un trabajo
+  static Future<Map<String, dynamic>> getJob(String jobId) async {
+    final response = await http.get(
+      Uri.parse('$_jobsEndpoint/$jobId'),
+      headers: BackendConfig.defaultHeaders,
+    ).timeout(BackendConfig.connectionTimeout);
+
+    if (response.statusCode == 200) {
+      return json.decode(response.body) as Map<String, dynamic>;
+    }
+    throw Exception('Error al consultar trabajo: ${response.statusCode} - ${response.body}');
+  }
+
+  /// Esperar a que un trabajo termine y devolver su resultado.
+  /// [onProgress] recibe (procesados, total) en cada consulta.
+  static Future<Map<String, dynamic>> waitForJob(
+    String jobId, {
+    void Function(int processed, int? total)? onProgress,
+  }) async {
+    final deadline = DateTime.now().add(maxWait);
+
+    while (DateTime.now().isBefore(deadline)) {
+      final job = await getJob(jobId);
+      final progress = job['progress'] as Map<String, dynamic>? ?? {};
+      onProgress?.call(progress['processed'] as int? ?? 0, progress['total'] as int?);
+
+      final status = job['status'] as String?;
+      if (status == 'completed') {
+        return (job['result'] as Map<String, dynamic>?) ?? {};
+      }
+      // `retrying`: el intento falló pero el backend lo reintentará; seguir esperando.
+      // Solo `failed` (intentos agotados) es definitivo.
+      if (status == 'failed') {
+        throw Exception('El trabajo $jobId falló: ${job['error']}');
+      }
+      if (status == 'retrying' && kDebugMode) {
+        print('Trabajo $jobId en reintento (intento ${job['attempts']}): ${job['error']}');
+      }
+
+      await Future.delayed(pollInterval);
+    }
+
+    throw Exception('Tiempo de espera agotado para el trabajo $jobId');
+  }
+
+  /// Interpretar la respuesta de un endpoint que puede encolar un trabajo:
+  /// si responde 202 con jobId espera al trabajo, si no devuelve el cuerpo tal cual.
+  static Future<Map<String, dynamic>> resolveResponse(
+    http.Response response, {
+    void Function(int processed, int? total)? onProgress,
+  }) async {
+    final body = json.decode(response.body) as Map<String, dynamic>;
+    final jobId = body['jobId'] as String?;
+    if (response.statusCode == 202 && jobId != null) {
+      if (kDebugMode) {
+        print('Trabajo encolado: $jobId');
+      }
+      return waitForJob(jobId, onProgress: onProgress);
+    }
+    return body;
+  }
+}
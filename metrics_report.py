@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reporte de costo y latencia por ruta de la función `api`.
+
+Lee los logs estructurados `request_metrics` que emite
+functions/src/metrics/instrumentation.ts y genera una tabla por ruta con
+percentiles de latencia, lecturas/escrituras de Firestore y costo estimado.
+
+Formatos de entrada aceptados (archivos o stdin):
+  - JSON de `gcloud logging read ... --format=json` (lista de entradas con jsonPayload)
+  - Una línea JSON por log (stdout de la función / emulador)
+  - Líneas de texto con un objeto JSON embebido (`firebase functions:log`)
+
+Uso:
+  gcloud logging read 'jsonPayload.message="request_metrics"' --freshness=1d --format=json > logs.json
+  python metrics_report.py logs.json
+  python metrics_report.py logs.json --sort p95 --csv > reporte.csv
+"""
+
+import argparse
+import csv
+import json
+import math
+import sys
+from collections import defaultdict
+
+LOG_MESSAGE = 'request_metrics'
+
+
+def iter_json_objects(text):
+    """Devolver los objetos JSON encontrados en el texto (documento completo o por línea)"""
+    stripped = text.strip()
+    if stripped.startswith('['):
+        try:
+            for entry in json.loads(stripped):
+                yield entry
+            return
+        except json.JSONDecodeError:
+            pass
+
+    for line in text.splitlines():
+        start = line.find('{')
+        if start < 0:
+            continue
+        try:
+            yield json.loads(line[start:])
+        except json.JSONDecodeError:
+            continue
+
+
+def extract_metrics(entry):
+    """Devolver el payload de métricas de una entrada de log, o None"""
+    if not isinstance(entry, dict):
+        return None
+    payload = entry.get('jsonPayload', entry)
+    if payload.get('message') != LOG_MESSAGE or 'route' not in payload:
+        return None
+    return payload
+
+
+def percentile(values, p):
+    """Percentil por rango más cercano sobre valores ordenados"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(p * len(values)))
+    return values[rank - 1]
+
+
+def build_report(records, read_price, write_price, delete_price):
+    by_route = defaultdict(list)
+    for record in records:
+        by_route[record['route']].append(record)
+
+    rows = []
+    for route, items in by_route.items():
+        latencies = sorted(float(r.get('latencyMs', 0)) for r in items)
+        reads = sum(int(r.get('reads', 0)) for r in items)
+        writes = sum(int(r.get('writes', 0)) for r in items)
+        deletes = sum(int(r.get('deletes', 0)) for r in items)
+        errors = sum(1 for r in items if int(r.get('status', 0)) >= 500)
+        cost = (reads * read_price + writes * write_price + deletes * delete_price) / 100000
+
+        rows.append({
+            'route': route,
+            'requests': len(items),
+            'errors_pct': round(100.0 * errors / len(items), 1),
+            'p50_ms': round(percentile(latencies, 0.50), 1),
+            'p95_ms': round(percentile(latencies, 0.95), 1),
+            'p99_ms': round(percentile(latencies, 0.99), 1),
+            'max_ms': round(latencies[-1], 1),
+            'reads': reads,
+            'reads_per_req': round(reads / len(items), 1),
+            'aggregation_reads': sum(int(r.get('aggregationReads', 0)) for r in items),
+            'transaction_reads': sum(int(r.get('transactionReads', 0)) for r in items),
+            'writes': writes,
+            'deletes': deletes,
+            'cost_usd': round(cost, 6),
+        })
+    return rows
+
+
+def print_table(rows):
+    columns = [
+        ('route', 'Ruta', '<'),
+        ('requests', 'Req', '>'),
+        ('errors_pct', '5xx%', '>'),
+        ('p50_ms', 'p50 ms', '>'),
+        ('p95_ms', 'p95 ms', '>'),
+        ('p99_ms', 'p99 ms', '>'),
+        ('reads', 'Lecturas', '>'),
+        ('reads_per_req', 'Lect/req', '>'),
+        ('aggregation_reads', 'Agg', '>'),
+        ('transaction_reads', 'Tx', '>'),
+        ('writes', 'Escrit.', '>'),
+        ('deletes', 'Borr.', '>'),
+        ('cost_usd', 'USD', '>'),
+    ]
+    # Costos con decimales fijos (str() mostraría 3.1e-05)
+    def cell(row, key):
+        return f"{row[key]:.6f}" if key == 'cost_usd' else str(row[key])
+
+    widths = {
+        key: max(len(title), *(len(cell(row, key)) for row in rows))
+        for key, title, _ in columns
+    }
+    print('  '.join(f"{title:{align}{widths[key]}}" for key, title, align in columns))
+    print('  '.join('-' * widths[key] for key, _, _ in columns))
+    for row in rows:
+        print('  '.join(f"{cell(row, key):{align}{widths[key]}}" for key, _, align in columns))
+
+    total_cost = sum(row['cost_usd'] for row in rows)
+    total_requests = sum(row['requests'] for row in rows)
+    print(f"\n📊 {total_requests} operaciones en {len(rows)} rutas - costo estimado: ${total_cost:.6f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reporte de costo y latencia por ruta desde logs request_metrics')
+    parser.add_argument('files', nargs='*', help='Archivos de log (por defecto stdin)')
+    parser.add_argument('--sort', default='cost_usd',
+                        choices=['cost_usd', 'reads', 'writes', 'requests', 'p95_ms', 'p99_ms'],
+                        help='Columna para ordenar (descendente)')
+    parser.add_argument('--csv', action='store_true', help='Salida en CSV')
+    # Precios por 100.000 operaciones (Firestore estándar; ajustar a la región del proyecto)
+    parser.add_argument('--read-price', type=float, default=0.06)
+    parser.add_argument('--write-price', type=float, default=0.18)
+    parser.add_argument('--delete-price', type=float, default=0.02)
+    args = parser.parse_args()
+
+    texts = []
+    if args.files:
+        for path in args.files:
+            with open(path, 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+    else:
+        texts.append(sys.stdin.read())
+
+    records = []
+    for text in texts:
+        for entry in iter_json_objects(text):
+            payload = extract_metrics(entry)
+            if payload is not None:
+                records.append(payload)
+
+    if not records:
+        print(f"⚠️ No se encontraron logs '{LOG_MESSAGE}'", file=sys.stderr)
+        return 1
+
+    rows = build_report(records, args.read_price, args.write_price, args.delete_price)
+    rows.sort(key=lambda row: row[args.sort], reverse=True)
+
+    if args.csv:
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows({**row, 'cost_usd': f"{row['cost_usd']:.6f}"} for row in rows)
+    else:
+        print_table(rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())